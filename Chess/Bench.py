@@ -0,0 +1,73 @@
+import argparse
+import time
+
+from Chess import Engine
+
+# Fixed benchmark positions, reached by playing the moves from the initial position
+# (name, moves in chess notation)
+BENCH_POSITIONS = [
+    ("Initial position", []),
+    ("Italian game", ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "f8c5", "c2c3", "g8f6"]),
+    ("Queen's gambit declined", ["d2d4", "d7d5", "c2c4", "e7e6", "b1c3", "g8f6", "c1g5", "f8e7", "e2e3", "e8g8"]),
+    ("Sicilian open", ["e2e4", "c7c5", "g1f3", "d7d6", "d2d4", "c5d4", "f3d4", "g8f6", "b1c3", "a7a6"]),
+    ("Open center tactics", ["e2e4", "e7e5", "g1f3", "b8c6", "d2d4", "e5d4", "f1c4", "g8f6", "e4e5", "d7d5"]),
+]
+
+DEFAULT_DEPTH = 3
+
+
+# Play the moves (in chess notation) from the current position of the game state
+def playMoves(gameState, moves):
+
+    for notation in moves:
+
+        move = gameState.findMoveByNotation(notation)
+
+        if move is None:
+            raise ValueError("Illegal move in benchmark position: " + notation)
+
+        gameState.makeMove(move)
+
+
+# Search a position at a fixed depth and return (nodes, seconds, best move, score)
+def searchPosition(moves, depth, moveOrdering):
+
+    gameState = Engine.GameState()
+    gameState.moveOrdering = moveOrdering
+    playMoves(gameState, moves)
+
+    start = time.perf_counter()
+    (bestMove, bestScore) = gameState.iterativeDeepening(maxLevel=depth)
+    elapsed = time.perf_counter() - start
+
+    notation = bestMove.getChessNotation() if bestMove is not None else "none"
+
+    return (gameState.nodes, elapsed, notation, bestScore)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Search node counts on fixed benchmark positions")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="depth searched in every position")
+    arguments = parser.parse_args()
+
+    totals = {False: [0, 0], True: [0, 0]}
+
+    for (name, moves) in BENCH_POSITIONS:
+        for moveOrdering in (False, True):
+
+            (nodes, elapsed, notation, score) = searchPosition(moves, arguments.depth, moveOrdering)
+
+            totals[moveOrdering][0] += nodes
+            totals[moveOrdering][1] += elapsed
+
+            print("{:<26} ordering {:<3}  nodes {:>9}  {:>7.2f}s  {:>7.0f} nodes/s  best {} ({})".format(
+                name, "on" if moveOrdering else "off", nodes, elapsed, nodes / max(elapsed, 1e-9), notation, score))
+
+    for moveOrdering in (False, True):
+        print("Total ordering {:<3}  nodes {:>9}  {:>7.2f}s".format(
+            "on" if moveOrdering else "off", totals[moveOrdering][0], totals[moveOrdering][1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+EMPTY_SQUARE = '--'
+
+# The twelve pieces that get their own bitboard, in the order of their indexes
+PIECES = ['wP', 'wN', 'wB', 'wR', 'wQ', 'wK',
+          'bP', 'bN', 'bB', 'bR', 'bQ', 'bK']
+
+PIECE_INDEX = {piece: index for index, piece in enumerate(PIECES)}
+
+# Index of the occupancy mask of each color
+COLOR_INDEX = {'w': 0, 'b': 1}
+
+
+# Return the square index of (row, col). Square 0 is the top left corner of the board (a8)
+# and square 63 is the bottom right corner (h1), so the indexes follow the rows of GameState.board
+def squareIndex(row, col):
+
+    return row * 8 + col
+
+
+# Return the (row, col) of a square index
+def squareCoordinates(square):
+
+    return (square >> 3, square & 7)
+
+
+# Iterate over the squares of a bitboard, from the lowest index to the highest
+def iterateSquares(bitboard):
+
+    while bitboard:
+
+        # Isolate the lowest set bit
+        lowestBit = bitboard & -bitboard
+
+        yield lowestBit.bit_length() - 1
+
+        bitboard ^= lowestBit
+
+
+# The board geometry of the engine (both backends) comes from here, every table is built by buildRays.
+# Directions of the sliding pieces (row offset, col offset)
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, 1), (1, -1))
+
+# Offsets of the squares a knight can jump to
+KNIGHT_JUMPS = ((-1, -2), (1, -2), (-1, 2), (1, 2), (-2, -1), (-2, 1), (2, -1), (2, 1))
+
+# Offsets of the squares a king can step to
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# Offsets of the squares attacked by a pawn of each color (white pawns move up the board, black pawns down)
+PAWN_CAPTURES = {'w': ((-1, -1), (-1, 1)), 'b': ((1, -1), (1, 1))}
+
+
+# Returns the squares (row, col) of the ray going out of every square (index row * 8 + col) by repeating
+# the offset at most maxSteps times, nearest square first
+def buildRays(rowOffset, colOffset, maxSteps = 7):
+
+    rays = []
+
+    for row in range(8):
+        for col in range(8):
+
+            ray = []
+
+            (r, c) = (row + rowOffset, col + colOffset)
+            while 0 <= r <= 7 and 0 <= c <= 7 and len(ray) < maxSteps:
+                ray.append((r, c))
+                r += rowOffset
+                c += colOffset
+
+            rays.append(tuple(ray))
+
+    return rays
+
+
+# Returns the squares (row, col) reached from every square (index row * 8 + col) by one step of one of the offsets
+def buildTargets(offsets):
+
+    steps = [buildRays(rowOffset, colOffset, 1) for (rowOffset, colOffset) in offsets]
+
+    return [sum((step[square] for step in steps), ()) for square in range(64)]
+
+
+# direction => the ray of squares in that direction from every square
+RAYS = {direction: buildRays(direction[0], direction[1]) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+
+# square => the squares that a knight or a king on it reaches
+KNIGHT_TARGETS = buildTargets(KNIGHT_JUMPS)
+KING_TARGETS = buildTargets(sorted(KING_STEPS))
+
+# color => square => the squares attacked by a pawn of that color on it
+PAWN_ATTACKS = {color: buildTargets(offsets) for (color, offsets) in PAWN_CAPTURES.items()}
+
+# Sliding attack tables (see initializeSliderTables). For every square, the mask of the squares whose occupancy
+# matters to the slider (its rays without the edge squares, a piece on the edge blocks nothing) and the attack
+# set of every occupancy of that mask. The masked occupancy itself is the key of the table, so the lookup is a
+# perfect hash of the occupancy like the index of a magic bitboard, without the magic multiplication
+ROOK_MASKS = []
+ROOK_ATTACKS = []
+BISHOP_MASKS = []
+BISHOP_ATTACKS = []
+
+
+# Return the squares attacked from a square along the directions, every ray stopping at the first occupied square
+def computeSlidingAttacks(square, occupied, directions):
+
+    attacks = 0
+
+    for direction in directions:
+        for (r, c) in RAYS[direction][square]:
+
+            bit = 1 << squareIndex(r, c)
+            attacks |= bit
+
+            if occupied & bit:
+                break
+
+    return attacks
+
+
+# Return the squares of the rays going out of a square whose occupancy can block the rays (the edge squares,
+# the last squares of the rays, can't)
+def computeRelevantMask(square, directions):
+
+    mask = 0
+
+    for direction in directions:
+        for (r, c) in RAYS[direction][square][:-1]:
+            mask |= 1 << squareIndex(r, c)
+
+    return mask
+
+
+# Fill the masks and attack tables of a slider for every square
+def buildSliderTable(directions, masks, attackTables):
+
+    for square in range(64):
+
+        mask = computeRelevantMask(square, directions)
+        attacks = {}
+
+        # Visit every subset of the mask (carry rippler)
+        occupancy = 0
+        while True:
+
+            attacks[occupancy] = computeSlidingAttacks(square, occupancy, directions)
+
+            occupancy = (occupancy - mask) & mask
+            if occupancy == 0:
+                break
+
+        masks.append(mask)
+        attackTables.append(attacks)
+
+
+# Build the sliding attack tables (once, the first time a bitboard board is created)
+def initializeSliderTables():
+
+    if len(ROOK_ATTACKS) == 0:
+        buildSliderTable(ROOK_DIRECTIONS, ROOK_MASKS, ROOK_ATTACKS)
+        buildSliderTable(BISHOP_DIRECTIONS, BISHOP_MASKS, BISHOP_ATTACKS)
+
+
+# Return the squares attacked by a rook on the square
+def getRookAttacks(square, occupied):
+
+    return ROOK_ATTACKS[square][occupied & ROOK_MASKS[square]]
+
+
+# Return the squares attacked by a bishop on the square
+def getBishopAttacks(square, occupied):
+
+    return BISHOP_ATTACKS[square][occupied & BISHOP_MASKS[square]]
+
+
+# Return the squares attacked by a queen on the square
+def getQueenAttacks(square, occupied):
+
+    return getRookAttacks(square, occupied) | getBishopAttacks(square, occupied)
+
+
+class BitboardRow():
+
+    # A view over one row of a BitboardBoard, so board[row][col] reads and writes keep working
+    def __init__(self, board, row):
+
+        self.board = board
+        self.offset = row * 8
+
+    def __getitem__(self, col):
+
+        return self.board.squares[self.offset + col]
+
+    def __setitem__(self, col, piece):
+
+        self.board.setPiece(self.offset + col, piece)
+
+    def __len__(self):
+
+        return 8
+
+    def __iter__(self):
+
+        return iter(self.board.squares[self.offset:self.offset + 8])
+
+    def __repr__(self):
+
+        return repr(self.board.squares[self.offset:self.offset + 8])
+
+
+class BitboardBoard():
+
+    # Build the bitboards from any 8x8 board of two character pieces (like the NumPy board of GameState)
+    def __init__(self, board):
+
+        # One 64 bit set for every piece type and color
+        self.pieces = [0] * len(PIECES)
+
+        # Occupancy masks of the white and black pieces
+        self.occupancy = [0, 0]
+
+        # Occupancy mask of all the pieces
+        self.occupied = 0
+
+        # Piece on every square, kept in sync with the bitboards for the board[row][col] view
+        self.squares = [EMPTY_SQUARE] * 64
+
+        initializeSliderTables()
+
+        for row in range(8):
+            for col in range(8):
+                self.setPiece(squareIndex(row, col), str(board[row][col]))
+
+    # Place a piece (or EMPTY_SQUARE) on a square, updating every bitboard touched by the change
+    def setPiece(self, square, piece):
+
+        bit = 1 << square
+
+        oldPiece = self.squares[square]
+
+        if oldPiece != EMPTY_SQUARE:
+
+            self.pieces[PIECE_INDEX[oldPiece]] ^= bit
+            self.occupancy[COLOR_INDEX[oldPiece[0]]] ^= bit
+            self.occupied ^= bit
+
+        if piece != EMPTY_SQUARE:
+
+            self.pieces[PIECE_INDEX[piece]] |= bit
+            self.occupancy[COLOR_INDEX[piece[0]]] |= bit
+            self.occupied |= bit
+
+        self.squares[square] = piece
+
+    # Return the bitboard of a piece ('wP', 'bK', ...)
+    def getPieceBitboard(self, piece):
+
+        return self.pieces[PIECE_INDEX[piece]]
+
+    # Return the occupancy mask of a color
+    def getColorBitboard(self, color):
+
+        return self.occupancy[COLOR_INDEX[color]]
+
+    # Iterate over the (row, col) of every piece of a color
+    def iteratePieceSquares(self, color):
+
+        for square in iterateSquares(self.occupancy[COLOR_INDEX[color]]):
+            yield squareCoordinates(square)
+
+    def __getitem__(self, row):
+
+        return BitboardRow(self, row)
+
+    def __len__(self):
+
+        return 8
+
+    def __iter__(self):
+
+        for row in range(8):
+            yield BitboardRow(self, row)
+
+    def __str__(self):
+
+        return '\n'.join(' '.join(self.squares[row * 8:row * 8 + 8]) for row in range(8))
+
+    def __repr__(self):
+
+        return 'BitboardBoard(\n' + str(self) + ')'
@@ -0,0 +1,225 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+
+from Chess import Engine
+from Chess import Pgn
+
+# The book is a file of 16 byte big endian entries sorted by key, like a Polyglot book:
+# key (64 bits), move (16 bits), weight (16 bits), learn (32 bits, always 0).
+# The key is the Zobrist hash of the position (GameState.hash), so the books are only valid for this engine
+ENTRY_FORMAT = ">QHHI"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+KEY_FORMAT = ">Q"
+
+# Layout of the move: to file (3 bits), to rank (3 bits), from file (3 bits), from rank (3 bits), promotion (3 bits).
+# Castling is stored as the two square move of the king
+BOOK_PROMOTIONS = [None, Engine.KNIGHT, Engine.BISHOP, Engine.ROOK, Engine.QUEEN]
+
+MAX_WEIGHT = 0xFFFF
+
+# The book used by the engine when no other one is given
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+
+# Plies of every game that get into a built book
+DEFAULT_BOOK_PLY = 16
+
+# Weight of a book move for every game that played it, by the result for the player who played it
+WIN_WEIGHT = 2
+DRAW_WEIGHT = 1
+
+
+# Pack a move into the 16 bit move of a book entry
+def encodeBookMove(move):
+
+    promotion = BOOK_PROMOTIONS.index(move.pawnPromotion[1]) if move.pawnPromotion is not None else 0
+
+    return move.endCol | (7 - move.endRow) << 3 | move.startCol << 6 | (7 - move.startRow) << 9 | promotion << 12
+
+
+class OpeningBook():
+
+    # path => book file. The file is memory mapped and never read into the process: every process that opens
+    # the same book shares the pages of the file, and a lookup only touches the pages of its binary search
+    def __init__(self, path = DEFAULT_BOOK_PATH):
+
+        self.file = open(path, "rb")
+
+        self.size = os.fstat(self.file.fileno()).st_size // ENTRY_SIZE
+
+        # An empty file can't be mapped
+        self.data = None
+        if self.size != 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Unmap and close the book file
+    def close(self):
+
+        if self.data is not None:
+            self.data.close()
+
+        self.file.close()
+
+    # Return the key of the entry at the index
+    def getKey(self, index):
+
+        return struct.unpack_from(KEY_FORMAT, self.data, index * ENTRY_SIZE)[0]
+
+    # Return [(move, weight)] of the entries of the key (16 bit book moves)
+    def findEntries(self, key):
+
+        # Binary search of the first entry with the key
+        low = 0
+        high = self.size
+
+        while low < high:
+
+            middle = (low + high) // 2
+
+            if self.getKey(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+
+        for index in range(low, self.size):
+
+            (entryKey, move, weight, learn) = struct.unpack_from(ENTRY_FORMAT, self.data, index * ENTRY_SIZE)
+
+            if entryKey != key:
+                break
+
+            entries.append((move, weight))
+
+        return entries
+
+    # Return [(move, weight)] of the valid moves of the current position that are in the book
+    def getMoves(self, gameState):
+
+        entries = self.findEntries(gameState.hash)
+
+        if len(entries) == 0:
+            return []
+
+        validMoves = {encodeBookMove(move): move for move in gameState.calculateAllValidMoves()}
+
+        # Entries of another position that happens to have the same key are left out if their moves aren't valid here
+        return [(validMoves[move], weight) for (move, weight) in entries if move in validMoves and weight != 0]
+
+    # Return a book move of the current position picked at random in proportion to the weights,
+    # None if the position isn't in the book
+    def selectMove(self, gameState):
+
+        bookMoves = self.getMoves(gameState)
+
+        if len(bookMoves) == 0:
+            return None
+
+        return random.choices([move for (move, weight) in bookMoves], [weight for (move, weight) in bookMoves])[0]
+
+
+# Return the reply with the highest weight in the book to the move, None if the position after it isn't in the book
+def getExpectedReply(book, gameState, move):
+
+    gameState.makeMove(move)
+    bookMoves = book.getMoves(gameState)
+    gameState.undoMove()
+
+    if len(bookMoves) == 0:
+        return None
+
+    return max(bookMoves, key=lambda bookMove: bookMove[1])[0].getChessNotation()
+
+
+# Return the opening book at the path, None if there is no book file
+def openBook(path = DEFAULT_BOOK_PATH):
+
+    if path is None or not os.path.isfile(path):
+        return None
+
+    return OpeningBook(path)
+
+
+# Count the moves played in the first plies of every game of the PGN files.
+# Returns {(key, book move): weight}, the weight is WIN_WEIGHT per win and DRAW_WEIGHT per draw
+# for the player who made the move
+def collectBookMoves(pgnPaths, maxPly = DEFAULT_BOOK_PLY):
+
+    weights = {}
+    games = 0
+
+    for pgnPath in pgnPaths:
+
+        with open(pgnPath, encoding="utf-8", errors="replace") as stream:
+
+            # Only the book plies of every game are replayed
+            for game in Pgn.readGames(stream, skipInvalidGames=True, maxPly=maxPly):
+
+                games += 1
+                gameState = game.gameState
+
+                # Take back the book plies from the last one
+                moves = list(gameState.moveLog)
+
+                for move in reversed(moves):
+
+                    gameState.undoMove()
+
+                    if game.result == "1/2-1/2":
+                        weight = DRAW_WEIGHT
+                    elif game.result == ("1-0" if gameState.whiteToMove else "0-1"):
+                        weight = WIN_WEIGHT
+                    else:
+                        weight = 0
+
+                    entry = (gameState.hash, encodeBookMove(move))
+                    weights[entry] = weights.get(entry, 0) + weight
+
+    return (weights, games)
+
+
+# Write the book file: every entry with a positive weight, sorted by key and by weight (highest first).
+# If a weight doesn't fit in 16 bits, every weight of the book is scaled down
+def writeBook(path, weights):
+
+    maxWeight = max(weights.values(), default=0)
+    scale = MAX_WEIGHT / maxWeight if maxWeight > MAX_WEIGHT else 1
+
+    entries = []
+    for ((key, move), weight) in weights.items():
+
+        weight = int(weight * scale)
+        if weight != 0:
+            entries.append((key, -weight, move))
+
+    entries.sort()
+
+    with open(path, "wb") as stream:
+        for (key, negativeWeight, move) in entries:
+            stream.write(struct.pack(ENTRY_FORMAT, key, move, -negativeWeight, 0))
+
+    return len(entries)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN files")
+    parser.add_argument("pgn", nargs="+", help="PGN files of the games")
+    parser.add_argument("--output", default=DEFAULT_BOOK_PATH, help="book file (default: the engine book)")
+    parser.add_argument("--ply", type=int, default=DEFAULT_BOOK_PLY, help="plies of every game that get into the book")
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+
+    (weights, games) = collectBookMoves(arguments.pgn, arguments.ply)
+    entries = writeBook(arguments.output, weights)
+
+    print("Games {}  entries {}  {:.2f}s  => {}".format(games, entries, time.perf_counter() - start, arguments.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 import numpy as np
 import random
+import time
+
+from Chess import Bitboard
+from Chess import TranspositionTable
+from Chess import Zobrist
 
 EMPTY_SQUARE = '--'
 WHITE = 'w'
@@ -19,12 +24,286 @@ BISHOP_VALUE = 30
 KNIGHT_VALUE = 30
 PAWN_VALUE = 10
 
+# Score of a checkmate at the root, a checkmate found ply moves deeper scores MATE_SCORE - ply
+MATE_SCORE = 999999
+# Scores beyond this are checkmates (at most MAX_PLY moves away)
+MAX_PLY = 1000
+MATE_THRESHOLD = MATE_SCORE - MAX_PLY
+# Bigger than every score, used for the initial alpha beta window
+INFINITY = 1000000
+
+# Score of a stalemate
+DRAW_SCORE = 0
+
+# Quiescence search: a capture is skipped if even winning the captured piece plus this margin
+# can't bring the score up to alpha (delta pruning)
+DELTA_MARGIN = 2 * PAWN_VALUE
+
+# Time management of iterativeDeepening
+# The share of the remaining clock given to one move (the game is assumed to last this many more moves)
+MOVES_TO_GO = 30
+# Part of the increment that is spent on every move
+INCREMENT_SHARE = 0.8
+# A move never gets more than this part of the remaining clock
+MAX_CLOCK_SHARE = 0.5
+# A new iteration isn't started once this part of the budget is used, since it would most likely not finish
+NEW_ITERATION_SHARE = 0.5
+# The time limits are checked once every this many nodes
+NODES_BETWEEN_TIME_CHECKS = 32
+
+
+# Raised inside the search when it runs out of time
+class SearchTimeout(Exception):
+    pass
+
+
 PROMOTION_PIECES = [ROOK, KNIGHT, BISHOP, QUEEN]
 #PROMOTION_PIECES = [QUEEN]
 
+# Value of every piece type (used by the move ordering)
+PIECE_VALUES = {PAWN: PAWN_VALUE, KNIGHT: KNIGHT_VALUE, BISHOP: BISHOP_VALUE,
+                ROOK: ROOK_VALUE, QUEEN: QUEEN_VALUE, KING: KING_VALUE}
+
+# Piece square tables: bonus (in the units of the piece values) of a piece standing on a square, seen from
+# white's side of the board (index row * 8 + col, row 0 is the 8th rank). Black pieces use the mirrored square.
+# These are the middlegame tables, the endgame tables follow
+PAWN_TABLE = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      1,   1,   2,   3,   3,   2,   1,   1,
+      1,   1,   1,   3,   3,   1,   1,   1,
+      0,   0,   0,   2,   2,   0,   0,   0,
+      1,  -1,  -1,   0,   0,  -1,  -1,   1,
+      1,   1,   1,  -2,  -2,   1,   1,   1,
+      0,   0,   0,   0,   0,   0,   0,   0
+]
+
+KNIGHT_TABLE = [
+     -5,  -4,  -3,  -3,  -3,  -3,  -4,  -5,
+     -4,  -2,   0,   0,   0,   0,  -2,  -4,
+     -3,   0,   1,   2,   2,   1,   0,  -3,
+     -3,   1,   2,   2,   2,   2,   1,  -3,
+     -3,   0,   2,   2,   2,   2,   0,  -3,
+     -3,   1,   1,   2,   2,   1,   1,  -3,
+     -4,  -2,   0,   1,   1,   0,  -2,  -4,
+     -5,  -4,  -3,  -3,  -3,  -3,  -4,  -5
+]
+
+BISHOP_TABLE = [
+     -2,  -1,  -1,  -1,  -1,  -1,  -1,  -2,
+     -1,   0,   0,   0,   0,   0,   0,  -1,
+     -1,   0,   1,   1,   1,   1,   0,  -1,
+     -1,   1,   1,   1,   1,   1,   1,  -1,
+     -1,   0,   1,   1,   1,   1,   0,  -1,
+     -1,   1,   1,   1,   1,   1,   1,  -1,
+     -1,   1,   0,   0,   0,   0,   1,  -1,
+     -2,  -1,  -1,  -1,  -1,  -1,  -1,  -2
+]
+
+ROOK_TABLE = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      1,   1,   1,   1,   1,   1,   1,   1,
+     -1,   0,   0,   0,   0,   0,   0,  -1,
+     -1,   0,   0,   0,   0,   0,   0,  -1,
+     -1,   0,   0,   0,   0,   0,   0,  -1,
+     -1,   0,   0,   0,   0,   0,   0,  -1,
+     -1,   0,   0,   0,   0,   0,   0,  -1,
+      0,   0,   0,   1,   1,   0,   0,   0
+]
+
+QUEEN_TABLE = [
+     -2,  -1,  -1,  -1,  -1,  -1,  -1,  -2,
+     -1,   0,   0,   0,   0,   0,   0,  -1,
+     -1,   0,   1,   1,   1,   1,   0,  -1,
+     -1,   0,   1,   1,   1,   1,   0,  -1,
+      0,   0,   1,   1,   1,   1,   0,  -1,
+     -1,   1,   1,   1,   1,   1,   0,  -1,
+     -1,   0,   1,   0,   0,   0,   0,  -1,
+     -2,  -1,  -1,  -1,  -1,  -1,  -1,  -2
+]
+
+KING_TABLE = [
+     -3,  -4,  -4,  -5,  -5,  -4,  -4,  -3,
+     -3,  -4,  -4,  -5,  -5,  -4,  -4,  -3,
+     -3,  -4,  -4,  -5,  -5,  -4,  -4,  -3,
+     -3,  -4,  -4,  -5,  -5,  -4,  -4,  -3,
+     -2,  -3,  -3,  -4,  -4,  -3,  -3,  -2,
+     -1,  -2,  -2,  -2,  -2,  -2,  -2,  -1,
+      2,   2,   0,   0,   0,   0,   2,   2,
+      2,   3,   1,   0,   0,   1,   3,   2
+]
+
+# In the endgame the pawns are worth more the closer they get to promotion
+PAWN_ENDGAME_TABLE = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      8,   8,   8,   8,   8,   8,   8,   8,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      3,   3,   3,   3,   3,   3,   3,   3,
+      2,   2,   2,   2,   2,   2,   2,   2,
+      1,   1,   1,   1,   1,   1,   1,   1,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0
+]
+
+# In the endgame the king leaves its shelter and becomes an active piece in the center
+KING_ENDGAME_TABLE = [
+     -5,  -4,  -3,  -2,  -2,  -3,  -4,  -5,
+     -3,  -2,  -1,   0,   0,  -1,  -2,  -3,
+     -3,  -1,   2,   3,   3,   2,  -1,  -3,
+     -3,  -1,   3,   4,   4,   3,  -1,  -3,
+     -3,  -1,   3,   4,   4,   3,  -1,  -3,
+     -3,  -1,   2,   3,   3,   2,  -1,  -3,
+     -3,  -3,   0,   0,   0,   0,  -3,  -3,
+     -5,  -3,  -3,  -3,  -3,  -3,  -3,  -5
+]
+
+MIDDLEGAME_TABLES = {PAWN: PAWN_TABLE, KNIGHT: KNIGHT_TABLE, BISHOP: BISHOP_TABLE,
+                     ROOK: ROOK_TABLE, QUEEN: QUEEN_TABLE, KING: KING_TABLE}
+
+ENDGAME_TABLES = {PAWN: PAWN_ENDGAME_TABLE, KNIGHT: KNIGHT_TABLE, BISHOP: BISHOP_TABLE,
+                  ROOK: ROOK_TABLE, QUEEN: QUEEN_TABLE, KING: KING_ENDGAME_TABLE}
+
+# Game phase: every piece left on the board adds its weight, so the phase goes from TOTAL_PHASE with all the
+# pieces (pure middlegame tables) down to 0 with only kings and pawns (pure endgame tables)
+PHASE_WEIGHTS = {PAWN: 0, KNIGHT: 1, BISHOP: 1, ROOK: 2, QUEEN: 4, KING: 0}
+TOTAL_PHASE = 24
+
+# piece => phase weight
+PIECE_PHASES = {color + pieceType: PHASE_WEIGHTS[pieceType] for color in (WHITE, BLACK) for pieceType in PHASE_WEIGHTS}
+
+
+# Build the value of every piece on every square (material plus piece square bonus of the given tables),
+# positive for white pieces and negative for black pieces
+def buildPieceSquareValues(tables):
+
+    pieceSquareValues = {}
+
+    for pieceType in tables:
+
+        table = tables[pieceType]
+
+        pieceSquareValues[WHITE + pieceType] = [PIECE_VALUES[pieceType] + table[square] for square in range(64)]
+
+        # Mirror the rows for black
+        pieceSquareValues[BLACK + pieceType] = [-(PIECE_VALUES[pieceType] + table[(7 - (square >> 3)) * 8 + (square & 7)])
+                                                for square in range(64)]
+
+    return pieceSquareValues
+
+
+# piece => value of the piece on every square (index row * 8 + col) in the middlegame and in the endgame
+MIDDLEGAME_SQUARE_VALUES = buildPieceSquareValues(MIDDLEGAME_TABLES)
+ENDGAME_SQUARE_VALUES = buildPieceSquareValues(ENDGAME_TABLES)
+
+
+# Blend the middlegame and endgame scores by the game phase (rounded towards zero so that
+# the score of a mirrored position is exactly the opposite)
+def taperScore(middlegameScore, endgameScore, phase):
+
+    phase = min(phase, TOTAL_PHASE)
+
+    score = middlegameScore * phase + endgameScore * (TOTAL_PHASE - phase)
+
+    if score < 0:
+        return -(-score // TOTAL_PHASE)
+
+    return score // TOTAL_PHASE
+
+# Vectorized evaluation: a board is encoded as 64 int8 piece codes (index row * 8 + col, 0 => empty square)
+PIECE_CODES = {EMPTY_SQUARE: 0}
+for pieceIndex, piece in enumerate(Bitboard.PIECES):
+    PIECE_CODES[piece] = pieceIndex + 1
+
+# piece code, square => middlegame and endgame value (positive for white, negative for black)
+MIDDLEGAME_LOOKUP = np.zeros((len(PIECE_CODES), 64), dtype=np.int64)
+ENDGAME_LOOKUP = np.zeros((len(PIECE_CODES), 64), dtype=np.int64)
+# piece code => phase weight
+PHASE_LOOKUP = np.zeros(len(PIECE_CODES), dtype=np.int64)
+
+for piece in Bitboard.PIECES:
+    MIDDLEGAME_LOOKUP[PIECE_CODES[piece]] = MIDDLEGAME_SQUARE_VALUES[piece]
+    ENDGAME_LOOKUP[PIECE_CODES[piece]] = ENDGAME_SQUARE_VALUES[piece]
+    PHASE_LOOKUP[PIECE_CODES[piece]] = PIECE_PHASES[piece]
+
+SQUARE_INDEXES = np.arange(64)
+
+
+# Encode an 8x8 board of two character pieces into 64 int8 piece codes
+def encodeBoard(board):
+
+    return np.array([PIECE_CODES[board[row][col]] for row in range(8) for col in range(8)], dtype=np.int8)
+
+
+# Evaluate a batch of encoded boards (an array of shape (positions, 64), or a single board of shape (64,))
+# in one call. Returns the score of every board, positive in favor of white and negative in favor of black
+def evaluateBatch(encodedBoards):
+
+    codes = np.asarray(encodedBoards).reshape(-1, 64).astype(np.intp)
+
+    middlegameScores = MIDDLEGAME_LOOKUP[codes, SQUARE_INDEXES].sum(axis=1)
+    endgameScores = ENDGAME_LOOKUP[codes, SQUARE_INDEXES].sum(axis=1)
+    phases = np.minimum(PHASE_LOOKUP[codes].sum(axis=1), TOTAL_PHASE)
+
+    # Same blend as taperScore
+    scores = middlegameScores * phases + endgameScores * (TOTAL_PHASE - phases)
+
+    return np.sign(scores) * (np.abs(scores) // TOTAL_PHASE)
+
+# Move ordering scores: the hash move comes first, then the captures and promotions (most valuable victim,
+# least valuable attacker), then the killer moves and last the quiet moves sorted by the history table
+HASH_MOVE_ORDER = 1 << 30
+CAPTURE_ORDER = 1 << 24
+FIRST_KILLER_ORDER = 1 << 23
+SECOND_KILLER_ORDER = FIRST_KILLER_ORDER - 1
+# The history table is halved before every search so that old cutoffs slowly lose weight
+HISTORY_AGING = 2
+# History scores stay below the killer moves
+MAX_HISTORY = SECOND_KILLER_ORDER - 1
+
+# Board geometry (see Bitboard): the directions of the sliding pieces (row offset, col offset), the offsets of the
+# king steps, and for every square (index row * 8 + col) the squares that a knight, a king or a pawn on it attacks
+# and the rays in every direction
+ROOK_DIRECTIONS = Bitboard.ROOK_DIRECTIONS
+BISHOP_DIRECTIONS = Bitboard.BISHOP_DIRECTIONS
+KING_STEPS = Bitboard.KING_STEPS
+KNIGHT_TARGETS = Bitboard.KNIGHT_TARGETS
+KING_TARGETS = Bitboard.KING_TARGETS
+PAWN_ATTACKS = Bitboard.PAWN_ATTACKS
+RAYS = Bitboard.RAYS
+
+# Move generation modes of calculateAllValidMoves
+# MOVE_GENERATION_FILTER => every possible move is made and undone to see if it leaves the king in check
+# MOVE_GENERATION_LEGAL => pins and checks are computed once per position and only legal moves are generated
+MOVE_GENERATION_FILTER = 0
+MOVE_GENERATION_LEGAL = 1
+
+# Packed moves (see Move.encode): start square | end square << 6 | promotion << 12 | castle << 15 | en passant << 17,
+# squares indexed row * 8 + col. A packed move is never 0 since a move never starts and ends on the same square
+MOVE_SQUARE_MASK = 0x3F
+MOVE_END_SHIFT = 6
+MOVE_PROMOTION_SHIFT = 12
+MOVE_CASTLE_SHIFT = 15
+MOVE_EN_PASSANT_SHIFT = 17
+# promotion code => promoted piece type (0 => no promotion)
+ENCODED_PROMOTIONS = [None, ROOK, KNIGHT, BISHOP, QUEEN]
+
+# piece => the same piece as a plain str. Every read of the numpy board creates a new numpy string,
+# the moves keep the shared str instead
+PIECE_NAMES = {piece: piece for piece in Bitboard.PIECES + [EMPTY_SQUARE]}
+
+# Initial number of entries of the undo state stack, it doubles whenever a game gets longer
+STATE_STACK_SIZE = 256
+
+# Forsyth-Edwards Notation of the initial position
+INITIAL_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
 class GameState():
 
-    def __init__(self):
+    # useBitboards = True => the board is stored as bitboards (Bitboard.BitboardBoard) instead of a NumPy array
+    # moveGenerationMode => the default mode of calculateAllValidMoves
+    # transpositionTableSize => memory budget of the transposition table in megabytes (None => no transposition table)
+    def __init__(self, useBitboards = False, moveGenerationMode = MOVE_GENERATION_LEGAL,
+                 transpositionTableSize = TranspositionTable.DEFAULT_SIZE_MB):
 
         self.board = np.array([[BLACK + ROOK, BLACK + KNIGHT, BLACK + BISHOP, BLACK + QUEEN, BLACK + KING, BLACK + BISHOP, BLACK + KNIGHT, BLACK + ROOK],
                               [BLACK + PAWN, BLACK + PAWN, BLACK + PAWN, BLACK + PAWN, BLACK + PAWN, BLACK + PAWN, BLACK + PAWN, BLACK + PAWN],
@@ -36,6 +315,19 @@ class GameState():
                               [WHITE + ROOK, WHITE + KNIGHT, WHITE + BISHOP, WHITE + QUEEN, WHITE + KING, WHITE + BISHOP, WHITE + KNIGHT, WHITE + ROOK]
                               ])
 
+        # Indicates if the board is backed by bitboards. The board[row][col] view stays the same either way
+        self.useBitboards = useBitboards
+
+        if useBitboards:
+            self.board = Bitboard.BitboardBoard(self.board)
+
+        # The mode used by calculateAllValidMoves (MOVE_GENERATION_FILTER, MOVE_GENERATION_LEGAL)
+        self.moveGenerationMode = moveGenerationMode
+
+        # Results of earlier searches, indexed by the hash of the position
+        self.transpositionTable = None
+        if transpositionTableSize is not None:
+            self.transpositionTable = TranspositionTable.TranspositionTable(transpositionTableSize)
 
         # Keeps track of the moves that are being made
         self.moveLog = []
@@ -86,9 +378,209 @@ class GameState():
         # Shows if the black king is in check
         self.blackKingInCheck = False
 
+        # The square that a pawn can move to when capturing en passant, (row, col) or None
+        self.enPassantSquare = None
+
+        # Number of plies played before the first move of the move log and the number of plies since the
+        # last capture or pawn move at that point (both come from the FEN of a loaded position)
+        self.initialPly = 0
+        self.initialHalfmoveClock = 0
+
+        # The state before every move of the move log (see saveState), preallocated and indexed by the
+        # number of moves so that undoMove restores the position without working anything out again
+        self.stateStack = [None] * STATE_STACK_SIZE
+
+        # Zobrist key of the position, updated by makeMove and undoMove
+        self.hash = Zobrist.computeHash(self.board, self.whiteToMove, self.getCastlingRights(), self.getEnPassantFile())
+
+        # Middlegame and endgame evaluation of the position (material and piece square bonuses) and the game phase,
+        # updated by makeMove and undoMove
+        (self.middlegameScore, self.endgameScore, self.phase) = self.computeEvaluationTerms()
+
+        # Number of positions visited by the searches (never reset by the searches, compare before and after)
+        self.nodes = 0
+
+        # Time (time.perf_counter()) at which the running search has to stop, None => no time limit
+        self.searchDeadline = None
+
+        # Event (threading or multiprocessing) that stops the running search when it gets set from another
+        # thread or process, None => the search can only be stopped by its deadline
+        self.stopEvent = None
+
+        # The depth of the last iteration completed by iterativeDeepening
+        self.completedLevel = 0
+
+        # Indicates if the search orders the moves (hash move, MVV-LVA captures, killer moves, history).
+        # Otherwise only the hash move is searched first
+        self.moveOrdering = True
+
+        # Indicates if selectBestMove scores all the positions after the valid moves with one evaluateBatch call
+        # instead of making and evaluating every move
+        self.batchEvaluation = False
+
+        # Indicates if the leaves of the search are resolved by a captures only quiescence search
+        # instead of being evaluated directly
+        self.quiescenceSearch = True
+
+        # Two quiet moves per ply that recently caused a cutoff
+        self.killerMoves = [[None, None] for ply in range(MAX_PLY)]
+
+        # Cutoffs caused by every quiet move ((moved piece, end row, end col) => score)
+        self.historyTable = {}
+
+    # Create a game state set to the position of a FEN string (the other arguments are the ones of __init__)
+    @classmethod
+    def from_fen(cls, fen, useBitboards = False, moveGenerationMode = MOVE_GENERATION_LEGAL,
+                 transpositionTableSize = TranspositionTable.DEFAULT_SIZE_MB):
+
+        fields = fen.split()
+
+        if len(fields) < 4:
+            raise ValueError("Invalid FEN (expected at least 4 fields): " + fen)
+
+        (placement, sideToMove, castling, enPassant) = fields[:4]
+        halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+
+        gameState = cls(useBitboards, moveGenerationMode, transpositionTableSize)
+
+        # Pieces, from the 8th rank to the 1st (a digit is a number of empty squares)
+        rows = placement.split('/')
+        if len(rows) != 8:
+            raise ValueError("Invalid FEN piece placement: " + placement)
+
+        board = np.full((8, 8), EMPTY_SQUARE, dtype='<U2')
+
+        for (row, rowPlacement) in enumerate(rows):
+
+            col = 0
+
+            for character in rowPlacement:
+
+                if character.isdigit():
+                    col += int(character)
+                    continue
+
+                if col > 7 or character.upper() not in PIECE_VALUES:
+                    raise ValueError("Invalid FEN piece placement: " + placement)
+
+                board[row][col] = (WHITE if character.isupper() else BLACK) + character.upper()
+                col += 1
+
+            if col != 8:
+                raise ValueError("Invalid FEN piece placement: " + placement)
+
+        gameState.board = Bitboard.BitboardBoard(board) if useBitboards else board
+
+        if sideToMove not in ('w', 'b'):
+            raise ValueError("Invalid FEN side to move: " + sideToMove)
+
+        gameState.whiteToMove = sideToMove == 'w'
+
+        # The kings and the rooks of the castling rights. A king or a rook without castling rights counts as moved
+        for (color, kingRow, shortRight, longRight) in ((WHITE, 7, 'K', 'Q'), (BLACK, 0, 'k', 'q')):
+
+            kingSquares = [(row, col) for row in range(8) for col in range(8) if board[row][col] == color + KING]
+
+            if len(kingSquares) != 1:
+                raise ValueError("Invalid FEN (every side needs one king): " + fen)
+
+            canCastle = kingSquares[0] == (kingRow, 4)
+            kingMoved = 0 if canCastle and (shortRight in castling or longRight in castling) else 1
+
+            rookLeft = (kingRow, 0) if board[kingRow][0] == color + ROOK else None
+            rookLeftMoved = 0 if kingMoved == 0 and rookLeft is not None and longRight in castling else 1
+
+            rookRight = (kingRow, 7) if board[kingRow][7] == color + ROOK else None
+            rookRightMoved = 0 if kingMoved == 0 and rookRight is not None and shortRight in castling else 1
+
+            if color == WHITE:
+                (gameState.whiteKing, gameState.whiteKingMoved) = (kingSquares[0], kingMoved)
+                (gameState.whiteRookLeft, gameState.whiteRookLeftMoved) = (rookLeft, rookLeftMoved)
+                (gameState.whiteRookRight, gameState.whiteRookRightMoved) = (rookRight, rookRightMoved)
+            else:
+                (gameState.blackKing, gameState.blackKingMoved) = (kingSquares[0], kingMoved)
+                (gameState.blackRookLeft, gameState.blackRookLeftMoved) = (rookLeft, rookLeftMoved)
+                (gameState.blackRookRight, gameState.blackRookRightMoved) = (rookRight, rookRightMoved)
+
+        if enPassant != '-':
+
+            if len(enPassant) != 2 or enPassant[0] not in Move.fileToCol or enPassant[1] not in Move.rankToRow:
+                raise ValueError("Invalid FEN en passant square: " + enPassant)
+
+            gameState.enPassantSquare = (Move.rankToRow[enPassant[1]], Move.fileToCol[enPassant[0]])
+
+        gameState.initialPly = 2 * (fullmoveNumber - 1) + (0 if gameState.whiteToMove else 1)
+        gameState.initialHalfmoveClock = halfmoveClock
+
+        gameState.whiteKingInCheck = gameState.checkIfInCheck(WHITE)
+        gameState.blackKingInCheck = gameState.checkIfInCheck(BLACK)
+
+        gameState.hash = Zobrist.computeHash(gameState.board, gameState.whiteToMove, gameState.getCastlingRights(),
+                                             gameState.getEnPassantFile())
+        (gameState.middlegameScore, gameState.endgameScore, gameState.phase) = gameState.computeEvaluationTerms()
+
+        return gameState
+
+    # Return the FEN string of the current position
+    def to_fen(self):
+
+        rows = []
+
+        for row in range(8):
+
+            rowPlacement = ''
+            emptySquares = 0
+
+            for col in range(8):
+
+                piece = self.board[row][col]
+
+                if piece == EMPTY_SQUARE:
+                    emptySquares += 1
+                    continue
+
+                if emptySquares != 0:
+                    rowPlacement += str(emptySquares)
+                    emptySquares = 0
+
+                rowPlacement += piece[1] if piece[0] == WHITE else piece[1].lower()
+
+            if emptySquares != 0:
+                rowPlacement += str(emptySquares)
+
+            rows.append(rowPlacement)
+
+        castlingRights = self.getCastlingRights()
+        castling = ''.join(letter for (right, letter) in ((1, 'K'), (2, 'Q'), (4, 'k'), (8, 'q')) if castlingRights & right)
+
+        enPassant = '-'
+        if self.enPassantSquare is not None:
+            enPassant = Move.colToFile[self.enPassantSquare[1]] + Move.rowToRank[self.enPassantSquare[0]]
+
+        # Plies since the last capture or pawn move
+        halfmoveClock = 0
+        for move in reversed(self.moveLog):
+
+            if move.capturedPiece != EMPTY_SQUARE or self.getTypeOfPiece(move.movedPiece) == PAWN:
+                break
+
+            halfmoveClock += 1
+
+        else:
+            halfmoveClock += self.initialHalfmoveClock
+
+        fullmoveNumber = (self.initialPly + len(self.moveLog)) // 2 + 1
+
+        return ' '.join(['/'.join(rows), 'w' if self.whiteToMove else 'b', castling if castling != '' else '-',
+                         enPassant, str(halfmoveClock), str(fullmoveNumber)])
+
     # Selects the move that maximizes the score of the current player and return that move
     # and the asociated score => (bestMove, bestScore)
-    def selectBestMove(self, alphaBeta = None):
+    # ply => distance from the root of the search (used for the checkmate score)
+    def selectBestMove(self, alphaBeta = None, ply = 0):
+
+        self.nodes += 1
 
         validMoves = self.calculateAllValidMoves()
 
@@ -102,21 +594,32 @@ class GameState():
 
             # Variables that will keep track of the best score and best move
             bestMove = None
-            bestScore = -999999 if color == WHITE else 999999
+            bestScore = -INFINITY if color == WHITE else INFINITY
 
             # A list of moves that generate the same best score
             bestMoves = []
 
-            for move in validMoves:
+            if self.batchEvaluation:
+                batchScores = evaluateBatch(self.encodeChildBoards(validMoves))
 
-                # Make the move
-                self.makeMove(move)
+            for (moveIndex, move) in enumerate(validMoves):
 
-                # Evaluate the position
-                score = self.evaluatePosition()
+                self.nodes += 1
 
-                # Undo the move
-                self.undoMove()
+                if self.batchEvaluation:
+
+                    score = int(batchScores[moveIndex])
+
+                else:
+
+                    # Make the move
+                    self.makeMove(move)
+
+                    # Evaluate the position
+                    score = self.evaluatePosition()
+
+                    # Undo the move
+                    self.undoMove()
 
                 if f(score, bestScore) == score:
                 # Check if this is the best move
@@ -146,17 +649,24 @@ class GameState():
             # Return the best move
             return (bestMove, bestScore)
 
-        # Loss reward
-        lossScore = -999999 if self.whiteToMove else 999999
+        return (None, self.getNoValidMovesScore(ply))
+
+    # Returns the score of a position where the current player has no valid moves:
+    # a checkmate (the sooner the better for the winner) or a stalemate
+    # Positive score is in favor of white and negative score is in favor of black
+    def getNoValidMovesScore(self, ply):
 
-        return (None, lossScore)
+        if not self.checkIfInCheck(WHITE if self.whiteToMove else BLACK):
+            return DRAW_SCORE
+
+        return -(MATE_SCORE - ply) if self.whiteToMove else MATE_SCORE - ply
 
     # Minimax for choosing a move
-    def miniMax(self, level):
+    def miniMax(self, level, ply = 0):
 
         if level == 1:
 
-            (bestMove, bestScore) = self.selectBestMove()
+            (bestMove, bestScore) = self.selectBestMove(ply=ply)
             return (bestMove, bestScore)
 
         else:
@@ -167,20 +677,19 @@ class GameState():
             # WHITE => max, BLACK => min
             f = max if self.whiteToMove else min
 
-            # Loss reward
-            lossScore = -999999 if self.whiteToMove else 999999
+            self.nodes += 1
 
             # The list of valid moves that the current player can make
             validMoves = self.calculateAllValidMoves()
 
-            # If the current player has no valid moves then it has lost
+            # If the current player has no valid moves then it's checkmate or stalemate
             if len(validMoves) == 0:
 
-                return (None, lossScore)
+                return (None, self.getNoValidMovesScore(ply))
 
             # Variables that will keep track of the best score and best move
             bestMove = None
-            bestScore = -999999 if color == WHITE else 999999
+            bestScore = -INFINITY if color == WHITE else INFINITY
 
             # A list of moves that generate the same best score
             bestMoves = []
@@ -191,7 +700,7 @@ class GameState():
                 self.makeMove(move)
 
                 # Ascend further into the tree
-                (childMove, childScore) = self.miniMax(level - 1)
+                (childMove, childScore) = self.miniMax(level - 1, ply + 1)
 
                 # Undo the move
                 self.undoMove()
@@ -221,108 +730,580 @@ class GameState():
             return (bestMove, bestScore)
 
     # Alpha beta prunning for choosing a move
-    def alphaBeta(self, level, alphaBeta = None):
+    # (alpha, beta) is the window of the search, the returned score is exact if it falls inside the window,
+    # otherwise it's a bound (fail soft). Positive score is in favor of white and negative score is in favor of black
+    def alphaBeta(self, level, alpha = -INFINITY, beta = INFINITY):
 
-        if level == 1:
+        # The search itself scores positions from the point of view of the current player
+        if self.whiteToMove:
 
-            (bestMove, bestScore) = self.selectBestMove(alphaBeta=alphaBeta)
+            (bestMove, bestScore) = self.negaMax(level, alpha, beta, 0)
             return (bestMove, bestScore)
 
+        (bestMove, bestScore) = self.negaMax(level, -beta, -alpha, 0)
+        return (bestMove, -bestScore)
+
+    # Negamax alpha beta search to the given depth. Scores are from the point of view of the current player,
+    # so the score of a position is minus the best score of the positions after the moves of the current player.
+    # Returns (bestMove, bestScore), with bestScore <= alpha meaning at most bestScore and bestScore >= beta at least
+    def negaMax(self, depth, alpha, beta, ply):
+
+        self.nodes += 1
+
+        if self.nodes % NODES_BETWEEN_TIME_CHECKS == 0:
+            self.checkSearchLimits()
+
+        # The best move found by an earlier search of this position
+        hashMove = None
+
+        entry = self.probeEntry()
+
+        if entry is not None:
+
+            (entryDepth, entryScore, entryBound, hashMove) = entry
+
+            if entryDepth >= depth:
+
+                entryScore = self.getScoreFromTable(entryScore, ply)
+
+                if entryBound == TranspositionTable.EXACT or \
+                        (entryBound == TranspositionTable.LOWER_BOUND and entryScore >= beta) or \
+                        (entryBound == TranspositionTable.UPPER_BOUND and entryScore <= alpha):
+                    return (hashMove, entryScore)
+
+        if depth == 0:
+
+            if self.quiescenceSearch:
+                return self.quiescence(alpha, beta, ply)
+
+            return (None, self.evaluatePosition() if self.whiteToMove else -self.evaluatePosition())
+
+        # The list of valid moves that the current player can make
+        validMoves = self.calculateAllValidMoves()
+
+        # If the current player has no valid moves then it's checkmate or stalemate
+        if len(validMoves) == 0:
+
+            score = self.getNoValidMovesScore(ply)
+            return (None, score if self.whiteToMove else -score)
+
+        if self.moveOrdering:
+
+            validMoves = self.orderMoves(validMoves, ply, hashMove)
+
+        # Search the best move of the earlier search first, it is the most likely to cause a cutoff
+        elif hashMove is not None and hashMove in validMoves:
+
+            validMoves.insert(0, validMoves.pop(validMoves.index(hashMove)))
+
+        originalAlpha = alpha
+
+        # Variables that will keep track of the best score and best move
+        bestMove = None
+        bestScore = -INFINITY
+
+        for move in validMoves:
+
+            # Make the move
+            self.makeMove(move)
+
+            # Ascend further into the tree
+            (childMove, childScore) = self.negaMax(depth - 1, -beta, -alpha, ply + 1)
+            score = -childScore
+
+            # Undo the move
+            self.undoMove()
+
+            if score > bestScore:
+
+                bestScore = score
+                bestMove = move
+
+                if score > alpha:
+
+                    alpha = score
+
+                    # The opponent already has a better option than allowing this position
+                    if alpha >= beta:
+
+                        # Remember the quiet moves that cause cutoffs, they are likely to do it again
+                        if move.capturedPiece == EMPTY_SQUARE and move.pawnPromotion is None:
+                            self.recordQuietCutoff(move, depth, ply)
+
+                        break
+
+        if self.transpositionTable is not None:
+
+            if bestScore <= originalAlpha:
+                bound = TranspositionTable.UPPER_BOUND
+            elif bestScore >= beta:
+                bound = TranspositionTable.LOWER_BOUND
+            else:
+                bound = TranspositionTable.EXACT
+
+            self.transpositionTable.store(self.hash, depth, self.getScoreForTable(bestScore, ply), bound, bestMove)
+
+        return (bestMove, bestScore)
+
+    # Search only the captures (and promotions) below the horizon of negaMax until the position is quiet,
+    # so that a piece left hanging at the last ply isn't counted as material. The current player can also
+    # stop capturing (stand pat), so the static evaluation is a lower bound of the score.
+    # A player in check can't stand pat: every move out of check is searched, and no move at all is a checkmate
+    def quiescence(self, alpha, beta, ply):
+
+        self.nodes += 1
+
+        if self.nodes % NODES_BETWEEN_TIME_CHECKS == 0:
+            self.checkSearchLimits()
+
+        inCheck = self.checkIfInCheck(WHITE if self.whiteToMove else BLACK)
+
+        # The cutoffs of the stand pat come before the move generation, which costs the most
+        if inCheck:
+
+            standPat = -INFINITY
+
         else:
 
-            # The color that the current player plays with
-            color = WHITE if self.whiteToMove else BLACK
+            standPat = self.evaluatePosition() if self.whiteToMove else -self.evaluatePosition()
 
-            # WHITE => max, BLACK => min
-            f = max if self.whiteToMove else min
+            if standPat >= beta:
+                return (None, standPat)
 
-            # Loss reward
-            lossScore = -999999 if self.whiteToMove else 999999
+            # Not even winning a queen would be enough
+            if standPat + QUEEN_VALUE + DELTA_MARGIN < alpha:
+                return (None, standPat)
 
-            # The list of valid moves that the current player can make
-            validMoves = self.calculateAllValidMoves()
+            if standPat > alpha:
+                alpha = standPat
 
-            # If the current player has no valid moves then it has lost
-            if len(validMoves) == 0:
-                return (None, lossScore)
+        validMoves = self.calculateAllValidMoves()
 
-            # Variables that will keep track of the best score and best move
-            bestMove = None
-            bestScore = -999999 if color == WHITE else 999999
+        # Checkmate or stalemate
+        if len(validMoves) == 0:
 
-            # A list of moves that generate the same best score
-            bestMoves = []
+            score = self.getNoValidMovesScore(ply)
+            return (None, score if self.whiteToMove else -score)
 
-            for move in validMoves:
+        if inCheck:
+            searchedMoves = validMoves
+        else:
+            searchedMoves = [move for move in validMoves
+                             if move.capturedPiece != EMPTY_SQUARE or move.pawnPromotion is not None]
 
-                # Make the move
-                self.makeMove(move)
+        bestMove = None
+        bestScore = standPat
 
-                # Ascend further into the tree
-                (childMove, childScore) = self.alphaBeta(level - 1, alphaBeta=bestScore)
+        if self.moveOrdering:
+            searchedMoves = self.orderMoves(searchedMoves, ply, None)
 
-                # Undo the move
-                self.undoMove()
+        for move in searchedMoves:
 
-                # Check if this is the best move
-                if f(childScore, bestScore) == childScore:
+            # Delta pruning (a move out of check is never pruned)
+            if not inCheck and move.pawnPromotion is None and \
+                    standPat + PIECE_VALUES[self.getTypeOfPiece(move.capturedPiece)] + DELTA_MARGIN < alpha:
+                continue
 
-                    # If another move existed that generated the same best score
-                    # add this move to the best moves list, else reset the best score
-                    # best move and best moves.
-                    if childScore == bestScore:
+            self.makeMove(move)
+            (childMove, childScore) = self.quiescence(-beta, -alpha, ply + 1)
+            score = -childScore
+            self.undoMove()
 
-                        bestMoves.append(move)
+            if score > bestScore:
 
-                    else:
+                bestScore = score
+                bestMove = move
 
-                        bestMoves = [move]
-                        bestScore = childScore
-                        bestMove = move
+                if score > alpha:
 
-                if alphaBeta is not None and f(alphaBeta, bestScore) == bestScore:
-                    break
+                    alpha = score
 
-            # If more than one best move exists return a random one
-            if len(bestMoves) > 1:
-                return (random.choice(bestMoves), bestScore)
+                    if alpha >= beta:
+                        break
 
-            # Return the best move
-            return (bestMove, bestScore)
+        return (bestMove, bestScore)
 
-    # Gradually increase the depth of the search
-    def iterativeDeepening(self, maxLevel = 4):
+    # Sort the moves so that the ones most likely to cause a cutoff are searched first
+    def orderMoves(self, validMoves, ply, hashMove):
+
+        killers = self.killerMoves[ply]
+        orderScores = {}
+
+        for move in validMoves:
+
+            if move == hashMove:
+
+                orderScore = HASH_MOVE_ORDER
+
+            elif move.capturedPiece != EMPTY_SQUARE or move.pawnPromotion is not None:
+
+                # Most valuable victim first, least valuable attacker first among captures of the same victim
+                orderScore = CAPTURE_ORDER - PIECE_VALUES[self.getTypeOfPiece(move.movedPiece)]
+
+                if move.capturedPiece != EMPTY_SQUARE:
+                    orderScore += PIECE_VALUES[self.getTypeOfPiece(move.capturedPiece)] * KING_VALUE
+
+                if move.pawnPromotion is not None:
+                    orderScore += PIECE_VALUES[self.getTypeOfPiece(move.pawnPromotion)] * KING_VALUE
+
+            elif move == killers[0]:
+
+                orderScore = FIRST_KILLER_ORDER
+
+            elif move == killers[1]:
+
+                orderScore = SECOND_KILLER_ORDER
+
+            else:
+
+                orderScore = self.historyTable.get((move.movedPiece, move.endRow, move.endCol), 0)
+
+            orderScores[move] = orderScore
+
+        return sorted(validMoves, key=orderScores.__getitem__, reverse=True)
+
+    # Update the killer moves and the history table after a quiet move caused a cutoff
+    def recordQuietCutoff(self, move, depth, ply):
+
+        killers = self.killerMoves[ply]
+
+        if move != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = move
 
-        # WHITE => max, BLACK => min
-        f = max if self.whiteToMove else min
+        historyKey = (move.movedPiece, move.endRow, move.endCol)
+
+        # Cutoffs close to the root save the most nodes
+        self.historyTable[historyKey] = min(self.historyTable.get(historyKey, 0) + depth * depth, MAX_HISTORY)
+
+    # Clear the killer moves and age the history table before a new search
+    def resetMoveOrdering(self):
+
+        for killers in self.killerMoves:
+            killers[0] = None
+            killers[1] = None
+
+        for historyKey in self.historyTable:
+            self.historyTable[historyKey] //= HISTORY_AGING
+
+    # Checkmate scores depend on the distance from the root, so they are stored in the transposition table
+    # as the distance from the stored position instead
+    def getScoreForTable(self, score, ply):
+
+        if score > MATE_THRESHOLD:
+            return score + ply
+
+        if score < -MATE_THRESHOLD:
+            return score - ply
+
+        return score
+
+    # Convert a score stored in the transposition table back to a distance from the root
+    def getScoreFromTable(self, score, ply):
+
+        if score > MATE_THRESHOLD:
+            return score - ply
+
+        if score < -MATE_THRESHOLD:
+            return score + ply
+
+        return score
+
+    # Gradually increase the depth of the search
+    # maxLevel => the deepest level searched (None => no limit, the search ends when the time runs out)
+    # moveTime => seconds that can be spent on the move
+    # remainingTime, increment => the clock of the current player, the time of the move is taken from it
+    # startLevel => the first level searched (the helpers of a parallel search skip levels)
+    # If the time runs out in the middle of an iteration, the result of the last completed iteration is returned.
+    # If even the first iteration is cut off, the move comes from getFallbackMove
+    def iterativeDeepening(self, maxLevel = 4, moveTime = None, remainingTime = None, increment = 0, startLevel = 1):
 
-        alphaBeta = -999999 if self.whiteToMove else 999999
         bestMove = None
+        bestScore = 0
+
+        self.completedLevel = 0
+
+        # Entries of the previous searches get replaced first
+        if self.transpositionTable is not None:
+            self.transpositionTable.newSearch()
+
+        self.resetMoveOrdering()
+
+        startTime = time.perf_counter()
+        budget = self.getMoveBudget(moveTime, remainingTime, increment)
+
+        # Moves that have to be taken back if the search is stopped in the middle of the tree
+        rootMoves = len(self.moveLog)
 
-        for level in range(1, maxLevel + 1):
+        level = startLevel
 
-            (bestMoveAtLevel, bestScoreAtLevel) = self.alphaBeta(level=level, alphaBeta=alphaBeta)
+        # Every iteration starts with the best moves of the previous one, found in the transposition table
+        while (maxLevel is None or level <= maxLevel) and level <= MAX_PLY:
 
-            if f(bestScoreAtLevel, alphaBeta) == bestScoreAtLevel:
+            if budget is not None:
 
-                alphaBeta = bestScoreAtLevel
-                bestMove = bestMoveAtLevel
+                # Don't start an iteration that would most likely not finish
+                if level > startLevel and time.perf_counter() - startTime > budget * NEW_ITERATION_SHARE:
+                    break
+
+                self.searchDeadline = startTime + budget
+
+            try:
+
+                (bestMoveAtLevel, bestScoreAtLevel) = self.alphaBeta(level=level)
 
-        return (bestMove, alphaBeta)
+            except SearchTimeout:
+
+                # Take back the moves of the interrupted search
+                while len(self.moveLog) > rootMoves:
+                    self.undoMove()
+
+                break
+
+            finally:
+
+                self.searchDeadline = None
+
+            (bestMove, bestScore) = (bestMoveAtLevel, bestScoreAtLevel)
+            self.completedLevel = level
+
+            # No move or a forced checkmate, searching deeper won't change the result
+            if bestMove is None or abs(bestScore) > MATE_THRESHOLD:
+                break
+
+            level += 1
+
+        # No iteration completed in time
+        if self.completedLevel == 0:
+            (bestMove, bestScore) = (self.getFallbackMove(), self.evaluatePosition())
+
+        return (bestMove, bestScore)
+
+    # Return the move to play when the search was stopped before it completed an iteration: the best move
+    # of an earlier search of the position if there is one, otherwise the first move of the move ordering.
+    # None if there are no valid moves
+    def getFallbackMove(self):
+
+        validMoves = self.calculateAllValidMoves()
+
+        if len(validMoves) == 0:
+            return None
+
+        return self.orderMoves(validMoves, 0, self.probeHashMove())[0]
+
+    # Return the valid move of the current position written in chess notation (e2e4, e7e8q), None if there is none
+    def findMoveByNotation(self, notation):
+
+        for move in self.calculateAllValidMoves():
+            if move.getChessNotation() == notation:
+                return move
+
+        return None
+
+    # Return the entry (depth, score, bound, best move) of the current position in the transposition table,
+    # None if there is no table or no entry
+    def probeEntry(self):
+
+        if self.transpositionTable is None:
+            return None
+
+        entry = self.transpositionTable.probe(self.hash)
+
+        # The shared transposition table stores packed moves
+        if entry is not None and type(entry[3]) is int:
+            entry = entry[:3] + (self.decodeMove(entry[3]),)
+
+        return entry
+
+    # Return the best move stored in the transposition table for the current position, None if there is none
+    def probeHashMove(self):
+
+        entry = self.probeEntry()
+
+        return entry[3] if entry is not None else None
+
+    # Turn a move packed by Move.encode back into a move of the current position
+    def decodeMove(self, encodedMove):
+
+        startSquare = encodedMove & MOVE_SQUARE_MASK
+        endSquare = encodedMove >> MOVE_END_SHIFT & MOVE_SQUARE_MASK
+        promotion = ENCODED_PROMOTIONS[encodedMove >> MOVE_PROMOTION_SHIFT & 0x7]
+
+        return Move((startSquare >> 3, startSquare & 7), (endSquare >> 3, endSquare & 7), self.board,
+                    enPassant=encodedMove >> MOVE_EN_PASSANT_SHIFT & 1 == 1,
+                    castle=encodedMove >> MOVE_CASTLE_SHIFT & 0x3, pawnPromotion=promotion)
+
+    # Returns the number of seconds that the search can spend on the move, None => no time limit
+    def getMoveBudget(self, moveTime, remainingTime, increment):
+
+        if moveTime is not None:
+            return moveTime
+
+        if remainingTime is None:
+            return None
+
+        budget = remainingTime / MOVES_TO_GO + increment * INCREMENT_SHARE
+
+        return min(budget, remainingTime * MAX_CLOCK_SHARE)
+
+    # Stop the search (by raising SearchTimeout) if it went past its deadline or if it was stopped from outside
+    def checkSearchLimits(self):
+
+        if self.searchDeadline is not None and time.perf_counter() >= self.searchDeadline:
+            raise SearchTimeout()
+
+        if self.stopEvent is not None and self.stopEvent.is_set():
+            raise SearchTimeout()
+
+    # Count the leaf nodes of the move generation tree at the given depth
+    def perft(self, depth):
+
+        if depth == 0:
+            return 1
+
+        validMoves = self.calculateAllValidMoves()
+
+        # The moves of the last level don't need to be made to be counted
+        if depth == 1:
+            return len(validMoves)
+
+        nodes = 0
+
+        for move in validMoves:
+
+            self.makeMove(move)
+            nodes += self.perft(depth - 1)
+            self.undoMove()
+
+        return nodes
+
+    # Perft that prints the number of leaf nodes under every move of the current position
+    # and returns the counts in a dictionary (chess notation => leaf nodes)
+    def perftDivide(self, depth):
+
+        counts = {}
+
+        for move in self.calculateAllValidMoves():
+
+            self.makeMove(move)
+            counts[move.getChessNotation()] = self.perft(depth - 1)
+            self.undoMove()
+
+            print(move.getChessNotation() + ": " + str(counts[move.getChessNotation()]))
+
+        print("Nodes: " + str(sum(counts.values())))
+
+        return counts
 
     # Evaluate the position
     # Positive score is in favor of white and negative score is in favor of black
     def evaluatePosition(self):
 
-        score = 0
+        # The middlegame and endgame scores and the phase are kept up to date by makeMove and undoMove
+        return taperScore(self.middlegameScore, self.endgameScore, self.phase)
+
+    # Returns the encoded boards (see encodeBoard) of the positions after every move, built by applying
+    # the moves to copies of the encoding of the current board
+    def encodeChildBoards(self, moves):
+
+        childBoards = np.tile(encodeBoard(self.board), (len(moves), 1))
+
+        for (moveIndex, move) in enumerate(moves):
+
+            childBoard = childBoards[moveIndex]
+
+            startSquare = move.startRow * 8 + move.startCol
+            endSquare = move.endRow * 8 + move.endCol
+
+            childBoard[startSquare] = 0
+            childBoard[endSquare] = PIECE_CODES[move.pawnPromotion if move.pawnPromotion is not None else move.movedPiece]
+
+            if move.enPassant == True:
+                childBoard[move.startRow * 8 + move.endCol] = 0
+
+            if move.castle == 1:
+                childBoard[startSquare + 1] = childBoard[startSquare + 3]
+                childBoard[startSquare + 3] = 0
+
+            elif move.castle == 2:
+                childBoard[startSquare - 1] = childBoard[startSquare - 4]
+                childBoard[startSquare - 4] = 0
+
+        return childBoards
+
+    # Compute the middlegame score, the endgame score and the game phase of the position from scratch
+    def computeEvaluationTerms(self):
+
+        middlegameScore = 0
+        endgameScore = 0
+        phase = 0
+
+        # With bitboards only the occupied squares are visited
+        if self.useBitboards:
+
+            for piece in Bitboard.PIECES:
+
+                middlegameValues = MIDDLEGAME_SQUARE_VALUES[piece]
+                endgameValues = ENDGAME_SQUARE_VALUES[piece]
+
+                for square in Bitboard.iterateSquares(self.board.getPieceBitboard(piece)):
+                    middlegameScore += middlegameValues[square]
+                    endgameScore += endgameValues[square]
+                    phase += PIECE_PHASES[piece]
+
+            return (middlegameScore, endgameScore, phase)
 
         for row in range(len(self.board)):
             for col in range(len(self.board[row])):
 
-                if self.board[row][col] != EMPTY_SQUARE:
-                    score += self.getValueOfPiece(self.board[row][col])
+                piece = self.board[row][col]
 
-        return score
+                if piece != EMPTY_SQUARE:
+                    middlegameScore += MIDDLEGAME_SQUARE_VALUES[piece][row * 8 + col]
+                    endgameScore += ENDGAME_SQUARE_VALUES[piece][row * 8 + col]
+                    phase += PIECE_PHASES[piece]
+
+        return (middlegameScore, endgameScore, phase)
+
+    # Add the change of the middlegame score, the endgame score and the phase caused by the move
+    # (the same pieces as getMoveHash)
+    def updateEvaluation(self, move):
+
+        startSquare = move.startRow * 8 + move.startCol
+        endSquare = move.endRow * 8 + move.endCol
+
+        landedPiece = move.pawnPromotion if move.pawnPromotion is not None else move.movedPiece
+
+        # The moved piece leaves the start square and lands (or gets promoted) on the end square
+        middlegameChange = MIDDLEGAME_SQUARE_VALUES[landedPiece][endSquare] - MIDDLEGAME_SQUARE_VALUES[move.movedPiece][startSquare]
+        endgameChange = ENDGAME_SQUARE_VALUES[landedPiece][endSquare] - ENDGAME_SQUARE_VALUES[move.movedPiece][startSquare]
+        phaseChange = PIECE_PHASES[landedPiece] - PIECE_PHASES[move.movedPiece]
+
+        # The captured piece leaves the board
+        if move.capturedPiece != EMPTY_SQUARE:
+
+            captureSquare = move.startRow * 8 + move.endCol if move.enPassant == True else endSquare
+
+            middlegameChange -= MIDDLEGAME_SQUARE_VALUES[move.capturedPiece][captureSquare]
+            endgameChange -= ENDGAME_SQUARE_VALUES[move.capturedPiece][captureSquare]
+            phaseChange -= PIECE_PHASES[move.capturedPiece]
+
+        # The rook jumps over the king when castling
+        if move.castle != 0:
+
+            rook = self.getColorOfPiece(move.movedPiece) + ROOK
+
+            if move.castle == 1:
+                (rookStart, rookEnd) = (startSquare + 3, startSquare + 1)
+            else:
+                (rookStart, rookEnd) = (startSquare - 4, startSquare - 1)
+
+            middlegameChange += MIDDLEGAME_SQUARE_VALUES[rook][rookEnd] - MIDDLEGAME_SQUARE_VALUES[rook][rookStart]
+            endgameChange += ENDGAME_SQUARE_VALUES[rook][rookEnd] - ENDGAME_SQUARE_VALUES[rook][rookStart]
+
+        self.middlegameScore += middlegameChange
+        self.endgameScore += endgameChange
+        self.phase += phaseChange
 
     # Return the value of a piece
     def getValueOfPiece(self, piece):
@@ -358,28 +1339,207 @@ class GameState():
         if self.getTypeOfPiece(piece) == KING:
             return multiplier * KING_VALUE
 
-    # Calculates all the valid moves of the current player
-    def calculateAllValidMoves(self):
+    # Calculates all the valid moves of the current player
+    # If no mode is given the moveGenerationMode of the game state is used
+    def calculateAllValidMoves(self, mode = None):
+
+        if mode is None:
+            mode = self.moveGenerationMode
+
+        if mode == MOVE_GENERATION_LEGAL:
+            return self.calculateAllLegalMoves()
+
+        # Color of the current player
+        color = WHITE if self.whiteToMove else BLACK
+
+        # List of capure moves
+        captureMoves = []
+        # Lis of non capture moves
+        nonCaptureMoves = []
+
+        for (row, col) in self.getPieceSquares(color):
+
+            #validMoves += (self.getPieceValidMoves(row, col))
+            (captureMovesForPiece, nonCaptureMovesForPiece) = self.getPieceValidMoves(row, col)
+            captureMoves += captureMovesForPiece
+            nonCaptureMoves += nonCaptureMovesForPiece
+
+        return captureMoves + nonCaptureMoves
+
+    # Calculates all the valid moves of the current player without making and undoing every possible move.
+    # The pinned pieces and the checks are computed once, then each possible move is kept only if it
+    # stays on its pin ray and, when the king is in check, captures the checking piece or blocks its ray
+    def calculateAllLegalMoves(self):
+
+        # Color of the current player
+        color = WHITE if self.whiteToMove else BLACK
+        oppositeColor = BLACK if self.whiteToMove else WHITE
+
+        (kingRow, kingCol) = self.whiteKing if self.whiteToMove else self.blackKing
+
+        (pins, checks) = self.getPinsAndChecks(kingRow, kingCol, color)
+
+        # The squares a piece must move to in order to stop a single check
+        evasionSquares = checks[0] if len(checks) == 1 else None
+
+        # List of capure moves
+        captureMoves = []
+        # Lis of non capture moves
+        nonCaptureMoves = []
+
+        for (row, col) in self.getPieceSquares(color):
+
+            if (row, col) == (kingRow, kingCol):
+
+                possibleMoves = self.getKingLegalMoves(row, col, oppositeColor)
+
+            # In a double check only the king can move
+            elif len(checks) > 1:
+
+                continue
+
+            else:
+
+                possibleMoves = []
+                pinDirection = pins.get((row, col))
+
+                for move in self.getPiecePossilbleMoves(row, col):
+
+                    # En passant removes two pawns from the board at once and can uncover an attack
+                    # on the king along the rank, so it is checked by making the move
+                    if move.enPassant == True:
+
+                        if self.checkIfMoveLeavesKingInCheck(move, color):
+                            continue
+
+                    else:
+
+                        # A pinned piece can only move along the line between the king and the pinning piece
+                        if pinDirection is not None and \
+                                (move.endRow - row) * pinDirection[1] != (move.endCol - col) * pinDirection[0]:
+                            continue
+
+                        if evasionSquares is not None and (move.endRow, move.endCol) not in evasionSquares:
+                            continue
+
+                    possibleMoves.append(move)
+
+            for move in possibleMoves:
+
+                if move.capturedPiece != EMPTY_SQUARE:
+                    captureMoves.append(move)
+                else:
+                    nonCaptureMoves.append(move)
+
+        return captureMoves + nonCaptureMoves
+
+    # Finds the pieces of color that are pinned to their king at (kingRow, kingCol) and the enemy pieces giving check.
+    # Returns (pins, checks) where pins maps the (row, col) of every pinned piece to the direction of its pin and
+    # checks holds, for every checking piece, the set of squares that capture it or block its ray
+    def getPinsAndChecks(self, kingRow, kingCol, color):
+
+        board = self.board
+        oppositeColor = BLACK if color == WHITE else WHITE
+        enemyQueen = oppositeColor + QUEEN
+
+        kingSquare = kingRow * 8 + kingCol
+
+        pins = {}
+        checks = []
+
+        # Walk every ray going out of the king
+        for (rowOffset, colOffset) in KING_STEPS:
+
+            # The enemy piece (besides the queen) that attacks along this ray
+            if rowOffset == 0 or colOffset == 0:
+                enemySlider = oppositeColor + ROOK
+            else:
+                enemySlider = oppositeColor + BISHOP
+
+            pinnedSquare = None
+            raySquares = set()
+
+            for (r, c) in RAYS[(rowOffset, colOffset)][kingSquare]:
+
+                piece = board[r][c]
+                raySquares.add((r, c))
+
+                if piece != EMPTY_SQUARE:
+
+                    if piece[0] == color:
+
+                        # Two friendly pieces on the ray mean that neither of them is pinned
+                        if pinnedSquare is not None:
+                            break
+
+                        pinnedSquare = (r, c)
+
+                    else:
+
+                        if piece == enemySlider or piece == enemyQueen:
+
+                            if pinnedSquare is None:
+                                checks.append(raySquares)
+                            else:
+                                pins[pinnedSquare] = (rowOffset, colOffset)
+
+                        break
+
+        # Knight checks
+        enemyKnight = oppositeColor + KNIGHT
+        for (r, c) in KNIGHT_TARGETS[kingSquare]:
+            if board[r][c] == enemyKnight:
+                checks.append({(r, c)})
+
+        # Pawn checks (a king is attacked by the enemy pawns on the squares that its own pawn would attack)
+        enemyPawn = oppositeColor + PAWN
+        for (r, c) in PAWN_ATTACKS[color][kingSquare]:
+            if board[r][c] == enemyPawn:
+                checks.append({(r, c)})
+
+        return (pins, checks)
+
+    # Returns the moves of the king at (row, col) that don't step onto an attacked square
+    def getKingLegalMoves(self, row, col, oppositeColor):
+
+        possibleMoves = self.getKingMoves(row, col)
+
+        # Lift the king off the board so that it doesn't block the rays of the pieces attacking it
+        king = self.board[row][col]
+        self.board[row][col] = EMPTY_SQUARE
+
+        legalMoves = [move for move in possibleMoves
+                      if not self.checkIfSquareAttacked(move.endRow, move.endCol, oppositeColor)]
+
+        self.board[row][col] = king
+
+        return legalMoves
+
+    # Checks if making the move would leave the king of color in check
+    def checkIfMoveLeavesKingInCheck(self, move, color):
+
+        self.makeMove(move)
+        inCheck = self.checkIfInCheck(color)
+        self.undoMove()
+
+        return inCheck
+
+    # Returns the (row, col) of every piece of the given color
+    def getPieceSquares(self, color):
 
-        # Color of the current player
-        color = WHITE if self.whiteToMove else BLACK
+        # The occupancy mask of the color already holds the squares
+        if self.useBitboards:
+            return list(self.board.iteratePieceSquares(color))
 
-        # List of capure moves
-        captureMoves = []
-        # Lis of non capture moves
-        nonCaptureMoves = []
+        pieceSquares = []
 
         for row in range(len(self.board)):
             for col in range(len(self.board[row])):
 
                 if self.getColorOfPiece(self.board[row][col]) == color:
+                    pieceSquares.append((row, col))
 
-                    #validMoves += (self.getPieceValidMoves(row, col))
-                    (captureMovesForPiece, nonCaptureMovesForPiece) = self.getPieceValidMoves(row, col)
-                    captureMoves += captureMovesForPiece
-                    nonCaptureMoves += nonCaptureMovesForPiece
-
-        return captureMoves + nonCaptureMoves
+        return pieceSquares
 
     # Checks if the current player selected one of his pieces
     def checkSelectedPiece(self, row, col):
@@ -393,6 +1553,15 @@ class GameState():
     # Make the corresponding move
     def makeMove(self, move):
 
+        # A packed move (see Move.encode)
+        if type(move) is int:
+            move = self.decodeMove(move)
+
+        self.saveState(move)
+
+        # Remove the castling rights and the en passant file of the current position from the hash
+        self.hash ^= self.getStateHash()
+
         # Check if the moved piece is a King
         if self.getTypeOfPiece(move.movedPiece) == KING:
 
@@ -452,6 +1621,10 @@ class GameState():
                     # Adjust the position of the right white rook
                     self.blackRookRight = (move.endRow, move.endCol)
 
+        # A captured rook can no longer castle
+        if self.getTypeOfPiece(move.capturedPiece) == ROOK:
+            self.captureRook(move)
+
         # Move the piece
         self.board[move.endRow][move.endCol] = move.movedPiece
         self.board[move.startRow][move.startCol] = EMPTY_SQUARE
@@ -474,6 +1647,14 @@ class GameState():
             self.board[move.startRow][move.startCol - 4] = EMPTY_SQUARE
             self.board[move.startRow][move.startCol - 1] = kingColor + ROOK
 
+            # Adjust the position of the castled rook
+            if kingColor == WHITE:
+                self.whiteRookLeftMoved += 1
+                self.whiteRookLeft = (move.startRow, move.startCol - 1)
+            else:
+                self.blackRookLeftMoved += 1
+                self.blackRookLeft = (move.startRow, move.startCol - 1)
+
         # Check if the move is a castle short move
         if move.castle == 1:
 
@@ -484,12 +1665,31 @@ class GameState():
             self.board[move.startRow][move.startCol + 3] = EMPTY_SQUARE
             self.board[move.startRow][move.startCol + 1] = kingColor + ROOK
 
+            # Adjust the position of the castled rook
+            if kingColor == WHITE:
+                self.whiteRookRightMoved += 1
+                self.whiteRookRight = (move.startRow, move.startCol + 1)
+            else:
+                self.blackRookRightMoved += 1
+                self.blackRookRight = (move.startRow, move.startCol + 1)
+
+        # A pawn that advances two squares can be captured en passant on the square it skipped
+        if self.getTypeOfPiece(move.movedPiece) == PAWN and abs(move.endRow - move.startRow) == 2:
+            self.enPassantSquare = ((move.startRow + move.endRow) // 2, move.endCol)
+        else:
+            self.enPassantSquare = None
+
         # Keep track of the moves
         self.moveLog.append((move))
 
         # Give the move to the other player
         self.whiteToMove = not self.whiteToMove
 
+        # Add the moved pieces, the side to move and the new castling rights and en passant file to the hash
+        self.hash ^= self.getMoveHash(move) ^ Zobrist.BLACK_TO_MOVE_KEY ^ self.getStateHash()
+
+        self.updateEvaluation(move)
+
     # Undo the last move
     def undoMove(self):
 
@@ -498,108 +1698,184 @@ class GameState():
 
             return
 
-        # If we undo a move then no king is checkmated
-        self.checkmateKing = None
+        # Get last move
+        move = self.moveLog.pop()
 
-        if len(self.moveLog) != 0:
-            # Get last move
-            move = self.moveLog.pop()
+        # Everything but the board comes back from the state stack
+        capturedPiece = self.restoreState()
 
-            # Put pieces back on the board
-            self.board[move.startRow][move.startCol] = move.movedPiece
+        # Put pieces back on the board
+        self.board[move.startRow][move.startCol] = move.movedPiece
 
-            # Check if the move was a pawn promoting
-            if move.pawnPromotion is not None:
-                self.board[move.startRow][move.startCol] = self.getColorOfPiece(move.pawnPromotion) + PAWN
+        # Check if the move was an En Passant pawn move
+        if move.enPassant == True:
+            self.board[move.startRow][move.endCol] = capturedPiece
+            self.board[move.endRow][move.endCol] = EMPTY_SQUARE
+        else:
+            self.board[move.endRow][move.endCol] = capturedPiece
 
-            # Check if the move was an En Passant pawn move
-            if move.enPassant == True:
-                self.board[move.startRow][move.endCol] = move.capturedPiece
-                self.board[move.endRow][move.endCol] = EMPTY_SQUARE
-            else:
-                self.board[move.endRow][move.endCol] = move.capturedPiece
+        # Check if the move is a castle long move
+        if move.castle == 2:
 
-            # Check if the move is a castle long move
-            if move.castle == 2:
-                
-                # Get color of the king
-                kingColor = self.getColorOfPiece(self.board[move.startRow][move.startCol])
+            # Move the Rook back
+            self.board[move.startRow][move.startCol - 4] = self.getColorOfPiece(move.movedPiece) + ROOK
+            self.board[move.startRow][move.startCol - 1] = EMPTY_SQUARE
 
-                # Move the Rook back
-                self.board[move.startRow][move.startCol - 4] = kingColor + ROOK
-                self.board[move.startRow][move.startCol - 1] = EMPTY_SQUARE
+        # Check if the move is a castle short move
+        if move.castle == 1:
 
-            # Check if the move is a castle short move
-            if move.castle == 1:
+            # Move the Rook back
+            self.board[move.startRow][move.startCol + 3] = self.getColorOfPiece(move.movedPiece) + ROOK
+            self.board[move.startRow][move.startCol + 1] = EMPTY_SQUARE
 
-                # Get color of the king
-                kingColor = self.getColorOfPiece(self.board[move.startRow][move.startCol])
+        # Give control to the other player
+        self.whiteToMove = not self.whiteToMove
 
-                # Move the Rook back
-                self.board[move.startRow][move.startCol + 3] = kingColor + ROOK
-                self.board[move.startRow][move.startCol + 1] = EMPTY_SQUARE
+    # Push the state of the position before the move onto the state stack: the hash, the evaluation,
+    # the en passant square, the piece captured by the move, the check flags and the castling bookkeeping
+    def saveState(self, move):
 
-            # Give control to the other player
-            self.whiteToMove = not self.whiteToMove
+        ply = len(self.moveLog)
 
-            # Check if the moved piece was a King
-            if self.getTypeOfPiece(move.movedPiece) == KING:
+        if ply == len(self.stateStack):
+            self.stateStack.extend([None] * len(self.stateStack))
 
-                if self.getColorOfPiece(move.movedPiece) == WHITE:
+        self.stateStack[ply] = (self.hash, self.middlegameScore, self.endgameScore, self.phase, self.enPassantSquare,
+                                move.capturedPiece, self.whiteKingInCheck, self.blackKingInCheck, self.checkmateKing,
+                                self.stalemate, self.whiteKing, self.whiteKingMoved, self.whiteRookLeft,
+                                self.whiteRookLeftMoved, self.whiteRookRight, self.whiteRookRightMoved, self.blackKing,
+                                self.blackKingMoved, self.blackRookLeft, self.blackRookLeftMoved, self.blackRookRight,
+                                self.blackRookRightMoved)
 
-                    # The white king moved
-                    self.whiteKingMoved -= 1
+    # Restore the state saved before the last move (already removed from the move log) and
+    # return the piece that the move captured
+    def restoreState(self):
 
-                    # Adjust the position of the white king
-                    self.whiteKing = (move.startRow, move.startCol)
-                else:
+        (self.hash, self.middlegameScore, self.endgameScore, self.phase, self.enPassantSquare,
+         capturedPiece, self.whiteKingInCheck, self.blackKingInCheck, self.checkmateKing,
+         self.stalemate, self.whiteKing, self.whiteKingMoved, self.whiteRookLeft,
+         self.whiteRookLeftMoved, self.whiteRookRight, self.whiteRookRightMoved, self.blackKing,
+         self.blackKingMoved, self.blackRookLeft, self.blackRookLeftMoved, self.blackRookRight,
+         self.blackRookRightMoved) = self.stateStack[len(self.moveLog)]
 
-                    # The black king moved
-                    self.blackKingMoved -= 1
+        return capturedPiece
 
-                    # Adjust the position of the black king
-                    self.blackKing = (move.startRow, move.startCol)
+    # A captured rook loses its castling rights: it counts as moved and its position is cleared so
+    # that another rook landing on the same square is never mistaken for it
+    def captureRook(self, move):
 
-        # Check if the moved piece is a Rook
-        if self.getTypeOfPiece(move.movedPiece) == ROOK:
+        captureSquare = (move.endRow, move.endCol)
 
-            if self.getColorOfPiece(move.movedPiece) == WHITE:
+        # The capturing rook (if any) has already been moved to the capture square, so only
+        # the rooks of the captured color are looked at
+        if move.capturedPiece == WHITE + ROOK:
 
-                # A white rook moved
-                if self.whiteRookLeft == (move.endRow, move.endCol):
+            if self.whiteRookLeft == captureSquare:
+                self.whiteRookLeft = None
+                self.whiteRookLeftMoved += 1
 
-                    # Adjust the number of times the white left rook moved
-                    self.whiteRookLeftMoved -= 1
+            elif self.whiteRookRight == captureSquare:
+                self.whiteRookRight = None
+                self.whiteRookRightMoved += 1
 
-                    self.whiteRookLeft = (move.startRow, move.startCol)
+        elif self.blackRookLeft == captureSquare:
+            self.blackRookLeft = None
+            self.blackRookLeftMoved += 1
 
-                if self.whiteRookRight == (move.endRow, move.endCol):
+        elif self.blackRookRight == captureSquare:
+            self.blackRookRight = None
+            self.blackRookRightMoved += 1
 
-                    # Adjust the number of times the white right rook moved
-                    self.whiteRookRightMoved -= 1
+    # Replace the piece that the pawn of the last move was promoted to (piece = KNIGHT, BISHOP, ROOK, QUEEN)
+    def changePawnPromotion(self, piece):
 
-                    # Adjust the position of the right white rook
-                    self.whiteRookRight = (move.startRow, move.startCol)
+        promotionMove = self.moveLog[-1]
 
+        self.undoMove()
+        self.makeMove(Move((promotionMove.startRow, promotionMove.startCol), (promotionMove.endRow, promotionMove.endCol),
+                           self.board, pawnPromotion=piece))
 
-            else:
+    # Returns the castling rights as a 4 bit mask (1 => white short, 2 => white long, 4 => black short, 8 => black long)
+    def getCastlingRights(self):
 
-                # A black rook moved
-                if self.blackRookLeft == (move.endRow, move.endCol):
+        castlingRights = 0
 
-                    # Adjust the number of times the white left rook moved
-                    self.blackRookLeftMoved -= 1
+        if self.whiteKingMoved == 0:
 
-                    self.blackRookLeft = (move.startRow, move.startCol)
+            if self.whiteRookRightMoved == 0:
+                castlingRights |= 1
 
-                if self.blackRookRight == (move.endRow, move.endCol):
+            if self.whiteRookLeftMoved == 0:
+                castlingRights |= 2
 
-                    # Adjust the number of times the white right rook moved
-                    self.blackRookRightMoved -= 1
+        if self.blackKingMoved == 0:
 
-                    # Adjust the position of the right white rook
-                    self.blackRookRight = (move.startRow, move.startCol)
+            if self.blackRookRightMoved == 0:
+                castlingRights |= 4
+
+            if self.blackRookLeftMoved == 0:
+                castlingRights |= 8
+
+        return castlingRights
+
+    # Returns the file (column) of the pawn that just advanced two squares, None if there is no such pawn or if
+    # no pawn of the player to move stands next to it (like Polyglot, so that the positions reached with and
+    # without the two square advance get the same hash)
+    def getEnPassantFile(self):
+
+        if self.enPassantSquare is None:
+            return None
+
+        (row, col) = self.enPassantSquare
+
+        # The pawns that can capture stand on the row of the advanced pawn
+        pawnRow = row + 1 if self.whiteToMove else row - 1
+        pawn = (WHITE if self.whiteToMove else BLACK) + PAWN
+
+        if 0 <= pawnRow < 8 and ((col > 0 and self.board[pawnRow][col - 1] == pawn) or
+                                 (col < 7 and self.board[pawnRow][col + 1] == pawn)):
+            return col
+
+        return None
+
+    # Returns the part of the hash that covers the castling rights and the en passant file
+    def getStateHash(self):
+
+        return Zobrist.CASTLING_KEYS[self.getCastlingRights()] ^ Zobrist.getEnPassantKey(self.getEnPassantFile())
+
+    # Returns the xor of the keys of every piece that the move takes off or puts on a square.
+    # Xoring it into the hash applies the move and xoring it again takes the move back
+    def getMoveHash(self, move):
+
+        pieceKeys = Zobrist.PIECE_KEYS
+
+        startSquare = move.startRow * 8 + move.startCol
+        endSquare = move.endRow * 8 + move.endCol
+
+        # The moved piece leaves the start square and lands (or gets promoted) on the end square
+        moveHash = pieceKeys[move.movedPiece][startSquare]
+        moveHash ^= pieceKeys[move.pawnPromotion if move.pawnPromotion is not None else move.movedPiece][endSquare]
+
+        # The captured piece leaves the board
+        if move.capturedPiece != EMPTY_SQUARE:
+
+            if move.enPassant == True:
+                moveHash ^= pieceKeys[move.capturedPiece][move.startRow * 8 + move.endCol]
+            else:
+                moveHash ^= pieceKeys[move.capturedPiece][endSquare]
 
+        # The rook jumps over the king when castling
+        if move.castle == 1:
+
+            rookKeys = pieceKeys[self.getColorOfPiece(move.movedPiece) + ROOK]
+            moveHash ^= rookKeys[startSquare + 3] ^ rookKeys[startSquare + 1]
+
+        elif move.castle == 2:
+
+            rookKeys = pieceKeys[self.getColorOfPiece(move.movedPiece) + ROOK]
+            moveHash ^= rookKeys[startSquare - 4] ^ rookKeys[startSquare - 1]
+
+        return moveHash
 
     # Returns the possible moves(including illegal moves that will put the player in check)
     def getPiecePossilbleMoves(self, row, col):
@@ -664,24 +1940,6 @@ class GameState():
 
         return (captureMoves, nonCaptureMoves)
 
-    # Checks if the piece is being moved on an empty sqaure or if it captures a piece of the opposite color
-    # Return 0 if the piece landed on an empty square, 1 if it captured a different color piece and
-    # -1 if it captured a similar colored piece
-    def checkIfMoveIsPossible(self, move):
-
-        capturedPieceColor = move.capturedPiece[0]
-        movedPieceColor = move.movedPiece[0]
-
-        # Check if the piece is on an empty square
-        if move.capturedPiece == EMPTY_SQUARE:
-            return 0
-
-        # Check if the piece hit a piece of the same color as her
-        if capturedPieceColor != movedPieceColor:
-            return 1
-
-        return -1
-
     # Generate all possible moves for a Pawn at (row, col)
     def getPawnMoves(self, row, col):
 
@@ -714,46 +1972,27 @@ class GameState():
                 possibleMoves.append(newMove)
 
             # Pawn Captures
-            if col > 0 and self.board[row - 1][col - 1][0] == BLACK:
-
-                # Check if the pawn promotes
-                if row == 1:
-
-                    for piece in PROMOTION_PIECES:
+            for (r, c) in PAWN_ATTACKS[WHITE][row * 8 + col]:
 
-                        newMove = Move((row, col), (row - 1, col - 1), self.board, pawnPromotion=piece)
-                        possibleMoves.append(newMove)
-                else:
-
-                    newMove = Move((row, col), (row - 1, col - 1), self.board)
-                    possibleMoves.append(newMove)
+                if self.board[r][c][0] == BLACK:
 
-            if col < 7 and self.board[row - 1][col + 1][0] == BLACK:
+                    # Check if the pawn promotes
+                    if row == 1:
 
-                # Check if the pawn promotes
-                if row == 1:
+                        for piece in PROMOTION_PIECES:
+                            newMove = Move((row, col), (r, c), self.board, pawnPromotion=piece)
+                            possibleMoves.append(newMove)
+                    else:
 
-                    for piece in PROMOTION_PIECES:
-                        newMove = Move((row, col), (row - 1, col + 1), self.board, pawnPromotion=piece)
+                        newMove = Move((row, col), (r, c), self.board)
                         possibleMoves.append(newMove)
-                else:
-
-                    newMove = Move((row, col), (row - 1, col + 1), self.board)
-                    possibleMoves.append(newMove)
-
-            # En Passant
-            if row == 3:
-                lastMove = self.moveLog[-1]
-                if lastMove.movedPiece == 'bP' and lastMove.endRow == 3 and\
-                        (lastMove.endCol == col - 1 or lastMove.endCol == col + 1):
 
-                    if lastMove.endCol == col + 1:
-                        newMove = Move((row, col), (row - 1, col + 1), self.board, enPassant = True)
-                        possibleMoves.append(newMove)
+            # En Passant (only a pawn that has just advanced two squares can be captured en passant)
+            if row == 3 and self.enPassantSquare is not None and self.enPassantSquare[0] == row - 1 and \
+                    abs(self.enPassantSquare[1] - col) == 1:
 
-                    if lastMove.endCol == col - 1:
-                        newMove = Move((row, col), (row - 1, col - 1), self.board, enPassant = True)
-                        possibleMoves.append(newMove)
+                newMove = Move((row, col), self.enPassantSquare, self.board, enPassant = True)
+                possibleMoves.append(newMove)
 
         # If the pawn is Black
         elif pieceColor == BLACK and row + 1 <= 7:
@@ -778,326 +2017,128 @@ class GameState():
                 possibleMoves.append(newMove)
 
             # Pawn Captures
-            if col > 0 and self.board[row + 1][col - 1][0] == WHITE:
-
-                # Check if the pawn promotes
-                if row == 6:
-                    for piece in PROMOTION_PIECES:
-                        newMove = Move((row, col), (row + 1, col - 1), self.board, pawnPromotion=piece)
-                        possibleMoves.append(newMove)
-                else:
-                    newMove = Move((row, col), (row + 1, col - 1), self.board)
-                    possibleMoves.append(newMove)
+            for (r, c) in PAWN_ATTACKS[BLACK][row * 8 + col]:
 
-            if col < 7 and self.board[row + 1][col + 1][0] == WHITE:
+                if self.board[r][c][0] == WHITE:
 
-                # Check if the pawn promotes
-                if row == 6:
-                    for piece in PROMOTION_PIECES:
-                        newMove = Move((row, col), (row + 1, col + 1), self.board, pawnPromotion=piece)
+                    # Check if the pawn promotes
+                    if row == 6:
+                        for piece in PROMOTION_PIECES:
+                            newMove = Move((row, col), (r, c), self.board, pawnPromotion=piece)
+                            possibleMoves.append(newMove)
+                    else:
+                        newMove = Move((row, col), (r, c), self.board)
                         possibleMoves.append(newMove)
-                else:
-                    newMove = Move((row, col), (row + 1, col + 1), self.board)
-                    possibleMoves.append(newMove)
 
-            # En Passant
-            if row == 4:
-                lastMove = self.moveLog[-1]
-                if lastMove.movedPiece == 'wP' and lastMove.endRow == 4 and\
-                        (lastMove.endCol == col - 1 or lastMove.endCol == col + 1):
+            # En Passant (only a pawn that has just advanced two squares can be captured en passant)
+            if row == 4 and self.enPassantSquare is not None and self.enPassantSquare[0] == row + 1 and \
+                    abs(self.enPassantSquare[1] - col) == 1:
 
-                    if lastMove.endCol == col + 1:
-                        newMove = Move((row, col), (row + 1, col + 1), self.board, enPassant = True)
-                        possibleMoves.append(newMove)
-
-                    if lastMove.endCol == col - 1:
-                        newMove = Move((row, col), (row + 1, col - 1), self.board, enPassant = True)
-                        possibleMoves.append(newMove)
+                newMove = Move((row, col), self.enPassantSquare, self.board, enPassant = True)
+                possibleMoves.append(newMove)
 
         return possibleMoves
 
     # Generate all possible moves for a Rook at (row, col)
     def getRookMoves(self, row, col):
 
-        # Initialize the possible moves list
-        possibleMoves = []
-
-        # Generate possible moves when moving the Rook Up
-        r = row - 1
-        while r >= 0:
-
-            newMove = Move((row, col), (r, col), self.board)
-            isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-            if isMovePossible == -1:
-                break
-            else:
-                possibleMoves.append(newMove)
-                if isMovePossible == 1:
-                    break
-
-            r -= 1
-
-        # Generate possible moves when moving the Rook Down
-        r = row + 1
-        while r <= 7:
-
-            newMove = Move((row, col), (r, col), self.board)
-            isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-            if isMovePossible == -1:
-                break
-            else:
-                possibleMoves.append(newMove)
-                if isMovePossible == 1:
-                    break
-
-            r += 1
-
-        # Generate possible moves when moving the Rook Right
-        c = col + 1
-        while c <= 7:
-
-            newMove = Move((row, col), (row, c), self.board)
-            isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-            if isMovePossible == -1:
-                break
-            else:
-                possibleMoves.append(newMove)
-                if isMovePossible == 1:
-                    break
-
-            c += 1
-
-        # Generate possible moves when moving the Rook Left
-        c = col - 1
-        while c >= 0:
-
-            newMove = Move((row, col), (row, c), self.board)
-            isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-            if isMovePossible == -1:
-                break
-            else:
-                possibleMoves.append(newMove)
-                if isMovePossible == 1:
-                    break
-
-            c -= 1
+        if self.useBitboards:
+            return self.getBitboardSlidingMoves(row, col, Bitboard.getRookAttacks)
 
-        return possibleMoves
+        return self.getSlidingMoves(row, col, ROOK_DIRECTIONS)
 
     # Generate all possible moves for a Knight at (row, col)
     def getKnightMoves(self, row, col):
 
-        # Initialize the possible moves list
-        possibleMoves = []
-
-        # Generate the two leftmost moves of a night
-        if col - 2 >= 0:
-            if row - 1 >= 0:
-
-                newMove = Move((row, col), (row - 1, col - 2), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
-
-            if row + 1 <= 7:
-
-                newMove = Move((row, col), (row + 1, col - 2), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
-
-        # Generate the two rightmost moves of a night
-        if col + 2 <= 7:
-            if row - 1 >= 0:
-
-                newMove = Move((row, col), (row - 1, col + 2), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
-
-            if row + 1 <= 7:
-
-                newMove = Move((row, col), (row + 1, col + 2), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
-
-        # Generate the two upmost moves of a night
-        if row - 2 >= 0:
-            if col - 1 >= 0:
-
-                newMove = Move((row, col), (row - 2, col - 1), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
-
-            if col + 1 <= 7:
-
-                newMove = Move((row, col), (row - 2, col + 1), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
-
-        # Generate the two downmost moves of a night
-        if row + 2 <= 7:
-            if col - 1 >= 0:
-
-                newMove = Move((row, col), (row + 2, col - 1), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
+        return self.getStepMoves(row, col, KNIGHT_TARGETS)
 
-            if col + 1 <= 7:
+    # Generate all possible moves for a Bishop at (row, col)
+    def getBishopMoves(self, row, col):
 
-                newMove = Move((row, col), (row + 2, col + 1), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
+        if self.useBitboards:
+            return self.getBitboardSlidingMoves(row, col, Bitboard.getBishopAttacks)
 
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
+        return self.getSlidingMoves(row, col, BISHOP_DIRECTIONS)
 
-        return possibleMoves
+    # Generate the moves of the sliding piece at (row, col) along the rays in the given directions.
+    # Every ray stops at the first piece, which is captured if it has the other color
+    def getSlidingMoves(self, row, col, directions):
 
-    # Generate all possible moves for a Bishop at (row, col)
-    def getBishopMoves(self, row, col):
+        board = self.board
+        color = board[row][col][0]
+        square = row * 8 + col
 
         # Initialize the possible moves list
         possibleMoves = []
 
-        # Generate possible moves on the Upper Left Diagonal
-        (r, c) = (row - 1, col - 1)
-        while r >= 0 and c >= 0:
+        for direction in directions:
+            for (r, c) in RAYS[direction][square]:
 
-            newMove = Move((row, col), (r, c), self.board)
-            isMovePossible = self.checkIfMoveIsPossible(newMove)
+                piece = board[r][c]
 
-            if isMovePossible == -1:
-                break
-            else:
-                possibleMoves.append(newMove)
-                if isMovePossible == 1:
+                if piece[0] == color:
                     break
 
-            r -= 1
-            c -= 1
-
-        # Generate possible moves on the Upper Right Diagonal
-        (r, c) = (row - 1, col + 1)
-        while r >= 0 and c <= 7:
-
-            newMove = Move((row, col), (r, c), self.board)
-            isMovePossible = self.checkIfMoveIsPossible(newMove)
+                possibleMoves.append(Move((row, col), (r, c), board))
 
-            if isMovePossible == -1:
-                break
-            else:
-                possibleMoves.append(newMove)
-                if isMovePossible == 1:
+                if piece != EMPTY_SQUARE:
                     break
 
-            r -= 1
-            c += 1
-
-        # Generate possible moves on the Downward Right Diagonal
-        (r, c) = (row + 1, col + 1)
-        while r <= 7 and c <= 7:
-
-            newMove = Move((row, col), (r, c), self.board)
-            isMovePossible = self.checkIfMoveIsPossible(newMove)
+        return possibleMoves
 
-            if isMovePossible == -1:
-                break
-            else:
-                possibleMoves.append(newMove)
-                if isMovePossible == 1:
-                    break
+    # Generate the moves of the sliding piece at (row, col) from its attack set, looked up in the sliding attack
+    # tables of the bitboard board (getAttacks = Bitboard.getRookAttacks, Bitboard.getBishopAttacks)
+    def getBitboardSlidingMoves(self, row, col, getAttacks):
 
-            r += 1
-            c += 1
+        board = self.board
+        square = row * 8 + col
 
-        # Generate possible moves on the Downward Left Diagonal
-        (r, c) = (row + 1, col - 1)
-        while r <= 7 and c >= 0:
+        targets = getAttacks(square, board.occupied) & ~board.getColorBitboard(board.squares[square][0])
 
-            newMove = Move((row, col), (r, c), self.board)
-            isMovePossible = self.checkIfMoveIsPossible(newMove)
+        return [Move((row, col), Bitboard.squareCoordinates(target), board) for target in Bitboard.iterateSquares(targets)]
 
-            if isMovePossible == -1:
-                break
-            else:
-                possibleMoves.append(newMove)
-                if isMovePossible == 1:
-                    break
+    # Generate the moves of the piece at (row, col) to the squares of the targets table
+    # (KNIGHT_TARGETS, KING_TARGETS) that aren't taken by a piece of the same color
+    def getStepMoves(self, row, col, targets):
 
-            r += 1
-            c -= 1
+        board = self.board
+        color = board[row][col][0]
 
-        return possibleMoves
+        return [Move((row, col), (r, c), board) for (r, c) in targets[row * 8 + col] if board[r][c][0] != color]
 
     # Generate all possible moves for a Queen at (row, col)
     def getQueenMoves(self, row, col):
 
+        if self.useBitboards:
+            return self.getBitboardSlidingMoves(row, col, Bitboard.getQueenAttacks)
+
         return self.getRookMoves(row, col) + self.getBishopMoves(row, col)
 
     # Generate all possible moves for a King at (row, col)
     def getKingMoves(self, row, col):
 
         # Initialize the possible moves list
-        possibleMoves = []
-
-        upperLeftCorner = (max(0, row - 1), max(0, col - 1))
-        lowerRightCorner = (min(row + 1, 7), min(col + 1, 7))
-
-        for r in range(upperLeftCorner[0], lowerRightCorner[0] + 1):
-            for c in range(upperLeftCorner[1], lowerRightCorner[1] + 1):
-
-                if (r,c) == (row, col):
-                    continue
-
-                newMove = Move((row, col), (r, c), self.board)
-                isMovePossible = self.checkIfMoveIsPossible(newMove)
-
-                if isMovePossible != -1:
-                    possibleMoves.append(newMove)
+        possibleMoves = self.getStepMoves(row, col, KING_TARGETS)
 
         # Castling
 
         # Get the color of the king
         kingColor = self.getColorOfPiece(self.board[row][col])
-        kingInCheck = self.whiteKingInCheck if kingColor == WHITE else self.blackKingInCheck
+        oppositeColor = BLACK if kingColor == WHITE else WHITE
         hasKingMoved = self.whiteKingMoved if kingColor == WHITE else self.blackKingMoved
         kingRookLeftMoved = self.whiteRookLeftMoved if kingColor == WHITE else self.blackRookLeftMoved
         kingRookRightMoved = self.whiteRookRightMoved if kingColor == WHITE else self.blackRookRightMoved
 
-        if hasKingMoved == 0 and not kingInCheck:
+        if hasKingMoved == 0 and not self.checkIfSquareAttacked(row, col, oppositeColor):
 
             # Castle long
             if kingRookLeftMoved == 0 and self.board[row][col - 1] == EMPTY_SQUARE and\
                     self.board[row][col - 2] == EMPTY_SQUARE and self.board[row][col - 3] == EMPTY_SQUARE and\
                     self.board[row][col - 4] == kingColor + ROOK:
 
-                newMove = Move((row, col), (row, col - 1), self.board)
-                self.makeMove(newMove)
-                inCheck1 = self.checkIfInCheck(kingColor)
-                self.undoMove()
-
-                newMove = Move((row, col), (row, col - 2), self.board)
-                self.makeMove(newMove)
-                inCheck2 = self.checkIfInCheck(kingColor)
-                self.undoMove()
-
                 # If the king will not pass through a square where he is in check during the castle
-                if not inCheck1 and not inCheck2:
+                if not self.checkIfSquareAttacked(row, col - 1, oppositeColor) and\
+                        not self.checkIfSquareAttacked(row, col - 2, oppositeColor):
                     newMove = Move((row, col), (row, col - 2), self.board, castle=2)
                     possibleMoves.append(newMove)
 
@@ -1105,23 +2146,12 @@ class GameState():
             if kingRookRightMoved == 0 and self.board[row][col + 1] == EMPTY_SQUARE and\
                     self.board[row][col + 2] == EMPTY_SQUARE and self.board[row][col + 3] == kingColor + ROOK:
 
-                newMove = Move((row, col), (row, col + 1), self.board)
-                self.makeMove(newMove)
-                inCheck1 = self.checkIfInCheck(kingColor)
-                self.undoMove()
-
-                newMove = Move((row, col), (row, col + 2), self.board)
-                self.makeMove(newMove)
-                inCheck2 = self.checkIfInCheck(kingColor)
-                self.undoMove()
-
                 # If the king will not pass through a square where he is in check during the castle
-                if not inCheck1 and not inCheck2:
+                if not self.checkIfSquareAttacked(row, col + 1, oppositeColor) and\
+                        not self.checkIfSquareAttacked(row, col + 2, oppositeColor):
                     newMove = Move((row, col), (row, col + 2), self.board, castle=1)
                     possibleMoves.append(newMove)
 
-
-
         return possibleMoves
 
     # Return the color of the piece(piece = (row, col))
@@ -1136,22 +2166,75 @@ class GameState():
 
     # Check if color is in check
     def checkIfInCheck(self, color):
-        oppositeColor = WHITE
 
         if color == WHITE:
-            oppositeColor = BLACK
+            return self.checkIfSquareAttacked(self.whiteKing[0], self.whiteKing[1], BLACK)
 
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
+        return self.checkIfSquareAttacked(self.blackKing[0], self.blackKing[1], WHITE)
 
-                #Check if at (row, col) exists a piece of the opposite color
-                if self.getColorOfPiece(self.board[row][col]) == oppositeColor:
+    # Check if the square at (row, col) is attacked by a piece of attackerColor.
+    # Instead of generating the moves of every enemy piece, look outward from the square
+    # along the knight jumps, the pawn diagonals, the king steps and the sliding rays
+    def checkIfSquareAttacked(self, row, col, attackerColor):
 
-                    # Get all the possible moves of the piece at row and col
-                    possibleMoves = self.getPiecePossilbleMoves(row, col)
-                    for move in possibleMoves:
-                        if self.getTypeOfPiece(move.capturedPiece) == KING:
-                            return True
+        board = self.board
+        square = row * 8 + col
+
+        # A pawn attacks the square from the squares that a pawn of the other color on it would attack
+        attackerPawn = attackerColor + PAWN
+        for (r, c) in PAWN_ATTACKS[BLACK if attackerColor == WHITE else WHITE][square]:
+            if board[r][c] == attackerPawn:
+                return True
+
+        # Knight jumps
+        attackerKnight = attackerColor + KNIGHT
+        for (r, c) in KNIGHT_TARGETS[square]:
+            if board[r][c] == attackerKnight:
+                return True
+
+        # King steps
+        attackerKing = attackerColor + KING
+        for (r, c) in KING_TARGETS[square]:
+            if board[r][c] == attackerKing:
+                return True
+
+        attackerRook = attackerColor + ROOK
+        attackerQueen = attackerColor + QUEEN
+        attackerBishop = attackerColor + BISHOP
+
+        # The sliders attack the square if a rook (bishop) on it would attack them
+        if self.useBitboards:
+
+            queens = board.getPieceBitboard(attackerQueen)
+
+            if Bitboard.getRookAttacks(square, board.occupied) & (board.getPieceBitboard(attackerRook) | queens):
+                return True
+
+            return Bitboard.getBishopAttacks(square, board.occupied) & (board.getPieceBitboard(attackerBishop) | queens) != 0
+
+        # Rook and queen rays
+        for direction in ROOK_DIRECTIONS:
+            for (r, c) in RAYS[direction][square]:
+
+                piece = board[r][c]
+
+                # The first piece on the ray blocks everything behind it
+                if piece != EMPTY_SQUARE:
+                    if piece == attackerRook or piece == attackerQueen:
+                        return True
+                    break
+
+        # Bishop and queen rays
+        for direction in BISHOP_DIRECTIONS:
+            for (r, c) in RAYS[direction][square]:
+
+                piece = board[r][c]
+
+                # The first piece on the ray blocks everything behind it
+                if piece != EMPTY_SQUARE:
+                    if piece == attackerBishop or piece == attackerQueen:
+                        return True
+                    break
 
         return False
 
@@ -1297,6 +2380,10 @@ class Move():
 
     colToFile = {v : k for k, v in fileToCol.items()}
 
+    # Millions of moves are created by a search, without a __dict__ per move they take a fraction of the memory
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "movedPiece", "pawnPromotion", "castle", "enPassant",
+                 "capturedPiece")
+
     # castle = 0 => no castle, castle = 1 => castle short, castle = 2 => castle long
     def __init__(self, startSquare, endSquare, board, enPassant = False, castle = 0, pawnPromotion = None):
 
@@ -1306,7 +2393,7 @@ class Move():
         self.endRow = endSquare[0]
         self.endCol = endSquare[1]
 
-        self.movedPiece = board[self.startRow][self.startCol]
+        self.movedPiece = PIECE_NAMES[board[self.startRow][self.startCol]]
 
         # Specifies if the pawn has been promoted and the piece that the pawn got promoted to
         self.pawnPromotion = self.movedPiece[0] + pawnPromotion if pawnPromotion is not None else pawnPromotion
@@ -1318,12 +2405,37 @@ class Move():
         self.enPassant = enPassant
 
         if enPassant == False:
-            self.capturedPiece = board[self.endRow][self.endCol]
+            self.capturedPiece = PIECE_NAMES[board[self.endRow][self.endCol]]
         else:
-            self.capturedPiece = board[self.startRow][self.endCol]
+            self.capturedPiece = PIECE_NAMES[board[self.startRow][self.endCol]]
+
+    # Two moves are the same if they move between the same squares and promote to the same piece
+    def __eq__(self, other):
+
+        return isinstance(other, Move) and self.startRow == other.startRow and self.startCol == other.startCol and\
+            self.endRow == other.endRow and self.endCol == other.endCol and self.pawnPromotion == other.pawnPromotion
 
+    def __hash__(self):
+
+        return hash((self.startRow, self.startCol, self.endRow, self.endCol, self.pawnPromotion))
+
+    # Pack the move into an int (see MOVE_SQUARE_MASK), GameState.decodeMove turns it back into a move
+    def encode(self):
+
+        promotion = ENCODED_PROMOTIONS.index(self.pawnPromotion[1]) if self.pawnPromotion is not None else 0
+
+        return (self.startRow * 8 + self.startCol) | (self.endRow * 8 + self.endCol) << MOVE_END_SHIFT | \
+            promotion << MOVE_PROMOTION_SHIFT | self.castle << MOVE_CASTLE_SHIFT | int(self.enPassant) << MOVE_EN_PASSANT_SHIFT
+
+    # The promotion piece is appended in lower case (e7e8q) so that every move has a different notation
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+
+        if self.pawnPromotion is not None:
+            notation += self.pawnPromotion[1].lower()
+
+        return notation
 
     def getRankFile(self, row, col):
         return self.colToFile[col] + self.rowToRank[row]
\ No newline at end of file
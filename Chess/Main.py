@@ -1,5 +1,6 @@
 import pygame as p
 from Chess import Engine
+from Chess import SearchWorker
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8
@@ -16,6 +17,12 @@ blackKingFliped = None
 
 PLAY_VS_COMPUTER = True
 
+# Seconds that the computer can think about a move
+COMPUTER_MOVE_TIME = 3
+
+# Indicates if the computer thinks on the player's time, about the position after the reply it expects
+PONDERING = True
+
 """
 Load the pieces textures into the PIECES_TEXTURES dictionary
 """
@@ -109,12 +116,10 @@ def playOneVsOne():
 
                     if piece is not None:
 
-                        color = Engine.BLACK
-                        if not gameState.whiteToMove:
-                            color = Engine.WHITE
-
                         hasToPromote = False
-                        gameState.board[gameState.moveLog[-1].endRow][gameState.moveLog[-1].endCol] = color + piece
+
+                        # Remake the promotion with the selected piece so that the hash of the game state stays valid
+                        gameState.changePawnPromotion(piece)
                         gameState.checkIfTheGameEnded()
 
             # Undo the last move if the U key is pressed
@@ -186,10 +191,16 @@ def playerVsComputer():
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
 
-    # Initialize game state
-    gameState = Engine.GameState()
+    # Initialize game state (the computer searches in the worker, which has its own transposition table)
+    gameState = Engine.GameState(transpositionTableSize=None)
     print(gameState.board)
 
+    # Searches the moves of the computer in another process, so that the window keeps drawing and
+    # handling events while the computer thinks
+    searchWorker = SearchWorker.SearchWorker()
+
+    thinkingFont = p.font.SysFont('calibri', 24)
+
     running = True
 
     # The selected piece
@@ -226,49 +237,50 @@ def playerVsComputer():
 
                     if piece is not None:
 
-                        color = Engine.BLACK
-                        if not gameState.whiteToMove:
-                            color = Engine.WHITE
-
                         hasToPromote = False
-                        gameState.board[gameState.moveLog[-1].endRow][gameState.moveLog[-1].endCol] = color + piece
+
+                        # Remake the promotion with the selected piece so that the hash of the game state stays valid
+                        gameState.changePawnPromotion(piece)
                         gameState.checkIfTheGameEnded()
 
-            # Check if it's the AI's move
-            elif ((not gameState.whiteToMove and player is Engine.WHITE) or \
-                    (gameState.whiteToMove and player is Engine.BLACK)) and\
-                    (gameState.stalemate == False and gameState.checkmateKing is None):
+                        # No reply to ponder on if the move ended the game
+                        if gameState.stalemate or gameState.checkmateKing is not None:
+                            searchWorker.cancel()
 
-                # Select the best move for the AI
-                #bestMove = gameState.selectBestMove()[0]
-                #bestMove = gameState.miniMax(level=3)[0]
-                bestMove = gameState.alphaBeta(level=3)[0]
-                #bestMove = gameState.iterativeDeepening(maxLevel=3)[0]
+            elif event.type == p.KEYDOWN:
 
-                if bestMove is not None:
-                    gameState.makeMove((bestMove))
+                # Undo the last move if the U key is pressed
+                if event.key == p.K_u:
 
+                    # While the computer thinks, cancel the search and only take back the move it was answering
+                    if searchWorker.isThinking():
 
-                    # Play the move sound
-                    MOVE_SOUND.play()
+                        searchWorker.cancel()
 
-                # Check if the move ended the game
-                gameState.checkIfTheGameEnded()
+                        gameState.undoMove()
+                        gameState.checkIfTheGameEnded()
 
-            # Undo the last move if the U key is pressed
-            elif event.type == p.KEYDOWN:
-                if event.key == p.K_u:
+                    else:
 
-                    gameState.undoMove()
-                    gameState.checkIfTheGameEnded()
-                    gameState.undoMove()
-                    gameState.checkIfTheGameEnded()
+                        # The pondering expected a reply to the move that gets taken back
+                        searchWorker.cancel()
+
+                        gameState.undoMove()
+                        gameState.checkIfTheGameEnded()
+                        gameState.undoMove()
+                        gameState.checkIfTheGameEnded()
 
                     selectedPiece = None
                     validMoves = []
 
+                # Make the computer play the best move it found so far if the Escape key is pressed
+                elif event.key == p.K_ESCAPE:
+
+                    searchWorker.stop()
+
             # Mouse input handler
-            elif event.type == p.MOUSEBUTTONDOWN and gameState.stalemate == False and gameState.checkmateKing is None:
+            elif event.type == p.MOUSEBUTTONDOWN and gameState.stalemate == False and gameState.checkmateKing is None and\
+                    not searchWorker.isThinking():
                 mousePos = p.mouse.get_pos()
 
                 row = mousePos[1] // SQ_DIMENSION
@@ -311,15 +323,66 @@ def playerVsComputer():
                                 hasToPromote = True
 
                             gameState.checkIfTheGameEnded()
+
+                            # No reply to ponder on if the move ended the game
+                            if gameState.stalemate or gameState.checkmateKing is not None:
+                                searchWorker.cancel()
+
                             MOVE_SOUND.play()
                             print(gameState.evaluatePosition())
                             break
 
+        # Check if it's the AI's move, the search starts once the player is done with the move
+        if ((not gameState.whiteToMove and player is Engine.WHITE) or (gameState.whiteToMove and player is Engine.BLACK)) and\
+                gameState.stalemate == False and gameState.checkmateKing is None and not hasToPromote and\
+                not searchWorker.isThinking():
+
+            # The search that pondered the move of the player goes on, with the time it already spent counted
+            if len(gameState.moveLog) == 0 or \
+                    not searchWorker.ponderHit(gameState.moveLog[-1].getChessNotation(), COMPUTER_MOVE_TIME):
+
+                searchWorker.startSearch(gameState, maxLevel=None, moveTime=COMPUTER_MOVE_TIME)
+
+        # Play the move of the AI once the search is over
+        result = searchWorker.poll()
+        if result is not None:
+
+            (notation, score, expectedReply) = result
+            bestMove = gameState.findMoveByNotation(notation)
+
+            if bestMove is not None:
+                gameState.makeMove(bestMove)
+
+                # Play the move sound
+                MOVE_SOUND.play()
+
+            # Check if the move ended the game
+            gameState.checkIfTheGameEnded()
+
+            # Think about the expected reply while the player thinks
+            if PONDERING and expectedReply is not None and gameState.stalemate == False and gameState.checkmateKing is None:
+                searchWorker.startPonder(gameState, expectedReply)
+
         if not hasToPromote:
             drawGameState(screen, gameState, selectedPiece, validMoves)
+
+            if searchWorker.isThinking():
+                drawThinkingIndicator(screen, thinkingFont)
+
         clock.tick(MAX_FPS)
         p.display.flip()
 
+    searchWorker.close()
+
+# Draw a banner with animated dots while the computer thinks
+def drawThinkingIndicator(screen, font):
+
+    dots = "." * (p.time.get_ticks() // 300 % 4)
+    text = font.render("Thinking" + dots, True, (0, 0, 0))
+
+    p.draw.rect(screen, p.Color("papayawhip"), p.Rect(0, 0, 4 * SQ_DIMENSION, SQ_DIMENSION // 2))
+    screen.blit(text, (SQ_DIMENSION // 4, (SQ_DIMENSION // 2 - text.get_height()) // 2))
+
 # This function creates a menu that allows the player to choose the piece that he wants to promote the pawn to
 def selectPromotedPiece(row, col):
 
@@ -0,0 +1,334 @@
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+from Chess import Bench
+from Chess import Engine
+from Chess import TranspositionTable
+
+DEFAULT_DEPTH = 4
+
+# State of a worker process (set by initializeWorker)
+# Best score found so far at the root of the running search, shared by every worker
+_sharedAlpha = None
+# The game state of the worker, kept between tasks so that its transposition table stays warm
+_workerState = None
+# FEN of the position of the worker game state
+_workerFen = None
+# Id of the search that the worker game state last worked on
+_workerSearch = None
+# Stop event of the worker game state, set when another worker raised the shared alpha
+_raisedAlpha = None
+
+
+# Runs in every worker process when it starts
+def initializeWorker(sharedAlpha):
+
+    global _sharedAlpha, _raisedAlpha
+
+    _sharedAlpha = sharedAlpha
+    _raisedAlpha = RaisedAlphaEvent()
+
+
+# Stands in for the stop event of the worker game state, which the search checks every few nodes: it is set
+# once another worker raised the shared alpha above the alpha that the running root move search started with
+class RaisedAlphaEvent():
+
+    def __init__(self):
+
+        self.alpha = -Engine.INFINITY
+
+    def is_set(self):
+
+        return _sharedAlpha.value > self.alpha
+
+
+# Return the worker game state set to the position of the FEN
+def getWorkerState(fen, searchId):
+
+    global _workerState, _workerFen, _workerSearch
+
+    if _workerState is None or _workerFen != fen:
+
+        _workerState = Engine.GameState.from_fen(fen)
+        _workerState.stopEvent = _raisedAlpha
+        _workerFen = fen
+
+    # A new search: entries of the previous searches get replaced first and the killer moves are stale
+    if _workerSearch != searchId:
+
+        if _workerState.transpositionTable is not None:
+            _workerState.transpositionTable.newSearch()
+
+        _workerState.resetMoveOrdering()
+        _workerSearch = searchId
+
+    return _workerState
+
+
+# Search one root move in a worker. The window starts at the best score found so far by every worker,
+# and a better score is published to the other workers. When another worker raises the shared alpha during
+# the search, the search is stopped and started again with the narrower window (the subtrees already
+# searched are in the transposition table).
+# Returns (move notation, score, exact, nodes), score from the point of view of the player at the root.
+# A score that isn't exact is only an upper bound (the move is no better than an already searched one)
+def searchRootMove(fen, searchId, rootMove, level):
+
+    gameState = getWorkerState(fen, searchId)
+
+    nodesBefore = gameState.nodes
+    rootPly = len(gameState.moveLog)
+    move = gameState.findMoveByNotation(rootMove)
+
+    while True:
+
+        alpha = _sharedAlpha.value
+        _raisedAlpha.alpha = alpha
+
+        gameState.makeMove(move)
+
+        try:
+
+            (bestMove, bestScore) = gameState.negaMax(level - 1, -Engine.INFINITY, -alpha, 1)
+            gameState.undoMove()
+            break
+
+        except Engine.SearchTimeout:
+
+            # The shared alpha went up, take back the moves of the stopped search and search again
+            while len(gameState.moveLog) > rootPly:
+                gameState.undoMove()
+
+    score = -bestScore
+    exact = score > alpha
+
+    # Raise the shared bound if the move is the best one so far
+    if exact:
+        with _sharedAlpha.get_lock():
+            if score > _sharedAlpha.value:
+                _sharedAlpha.value = score
+
+    return (rootMove, score, exact, gameState.nodes - nodesBefore)
+
+
+class ParallelSearch():
+
+    # workers => number of worker processes, None => one per core
+    def __init__(self, workers = None):
+
+        self.workers = workers if workers is not None else os.cpu_count()
+
+        # Best score found so far at the root, raised by the workers as they finish their moves
+        self.sharedAlpha = multiprocessing.Value('q', -Engine.INFINITY)
+
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=initializeWorker,
+                                                               initargs=(self.sharedAlpha,))
+
+        # Number of searches started, lets the workers know when a new search begins
+        self.searches = 0
+
+        # Number of positions visited by the workers during the last search
+        self.nodes = 0
+
+    # Stop the worker processes
+    def close(self):
+
+        self.executor.shutdown()
+
+    # Alpha beta search to the given level with the root moves split across the worker processes.
+    # The first move (the best one according to the move ordering) is searched alone to set a bound
+    # (young brothers wait), then the other moves are searched in parallel with the shared bound.
+    # Returns (bestMove, bestScore) like GameState.alphaBeta, positive score in favor of white
+    def alphaBeta(self, gameState, level):
+
+        self.searches += 1
+        self.nodes = 0
+
+        validMoves = gameState.calculateAllValidMoves()
+
+        # Nothing to split, the search is over at once
+        if len(validMoves) == 0 or level <= 1:
+            return gameState.alphaBeta(level)
+
+        # The best move of a previous search of the position comes first
+        orderedMoves = gameState.orderMoves(validMoves, 0, gameState.probeHashMove())
+        movesByNotation = {move.getChessNotation(): move for move in orderedMoves}
+
+        fen = gameState.to_fen()
+        self.sharedAlpha.value = -Engine.INFINITY
+
+        # Eldest brother first
+        results = [self.executor.submit(searchRootMove, fen, self.searches, orderedMoves[0].getChessNotation(), level).result()]
+
+        futures = [self.executor.submit(searchRootMove, fen, self.searches, move.getChessNotation(), level)
+                   for move in orderedMoves[1:]]
+        results += [future.result() for future in futures]
+
+        bestNotation = None
+        bestScore = -Engine.INFINITY
+        bestExact = False
+
+        # An exact score wins over an upper bound of the same value
+        for (notation, score, exact, nodes) in results:
+
+            self.nodes += nodes
+
+            if score > bestScore or (score == bestScore and exact and not bestExact):
+                (bestNotation, bestScore, bestExact) = (notation, score, exact)
+
+        bestMove = movesByNotation[bestNotation]
+
+        if gameState.transpositionTable is not None:
+            gameState.transpositionTable.store(gameState.hash, level, bestScore, TranspositionTable.EXACT, bestMove)
+
+        return (bestMove, bestScore if gameState.whiteToMove else -bestScore)
+
+
+# Runs in every helper process of a lazy SMP search: search the same position as the main search with the
+# shared transposition table. Helpers with an odd index start one level deeper, so that the processes don't
+# all search the same iteration at the same time. The helper is stopped by the main search when it's done
+def runLazySmpHelper(tableName, tableSize, generation, fen, maxLevel, moveTime, helperIndex):
+
+    gameState = Engine.GameState.from_fen(fen, transpositionTableSize=None)
+
+    gameState.transpositionTable = TranspositionTable.SharedTranspositionTable(tableSize, tableName)
+    gameState.transpositionTable.generation = generation
+
+    startLevel = 1 + helperIndex % 2
+
+    # Keep searching until stopped, a helper that finishes early would leave its core idle
+    gameState.iterativeDeepening(maxLevel=None if maxLevel is None else maxLevel + 1, moveTime=moveTime,
+                                 startLevel=startLevel)
+
+    gameState.transpositionTable.close()
+
+
+class LazySmpSearch():
+
+    # workers => number of processes searching (the calling process and workers - 1 helpers), None => one per core
+    # sizeInMegabytes => memory of the shared transposition table
+    def __init__(self, workers = None, sizeInMegabytes = TranspositionTable.DEFAULT_SIZE_MB):
+
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.sizeInMegabytes = sizeInMegabytes
+
+        self.transpositionTable = TranspositionTable.SharedTranspositionTable(sizeInMegabytes)
+
+        # Number of positions visited by the main search during the last search
+        self.nodes = 0
+
+    # Free the shared transposition table
+    def close(self):
+
+        self.transpositionTable.close()
+        self.transpositionTable.unlink()
+
+    # Run GameState.iterativeDeepening in the calling process while the helper processes search the same
+    # position and fill the shared transposition table. Returns the result of the main search
+    def iterativeDeepening(self, gameState, maxLevel = 4, moveTime = None):
+
+        fen = gameState.to_fen()
+
+        # Every process starts the search from the same generation
+        helpers = [multiprocessing.Process(target=runLazySmpHelper, daemon=True,
+                                           args=(self.transpositionTable.name, self.sizeInMegabytes,
+                                                 self.transpositionTable.generation, fen, maxLevel, moveTime, helperIndex))
+                   for helperIndex in range(1, self.workers)]
+
+        for helper in helpers:
+            helper.start()
+
+        ownTable = gameState.transpositionTable
+        gameState.transpositionTable = self.transpositionTable
+
+        nodesBefore = gameState.nodes
+
+        try:
+
+            return gameState.iterativeDeepening(maxLevel=maxLevel, moveTime=moveTime)
+
+        finally:
+
+            gameState.transpositionTable = ownTable
+            self.nodes = gameState.nodes - nodesBefore
+
+            # The table stays consistent, an entry torn by a stopped helper doesn't validate
+            for helper in helpers:
+                helper.terminate()
+
+            for helper in helpers:
+                helper.join()
+
+
+# Search every bench position with the same search in a single process and with the parallel search,
+# and print the times and the speedup. The root split is compared with alphaBeta, lazy SMP with
+# iterativeDeepening and a transposition table of the same size, emptied before every position
+def compareSearches(parallelSearch, depth, lazySmp):
+
+    totals = [0, 0]
+
+    for (name, moves) in Bench.BENCH_POSITIONS:
+
+        if lazySmp:
+            gameState = Engine.GameState(transpositionTableSize=parallelSearch.sizeInMegabytes)
+        else:
+            gameState = Engine.GameState()
+
+        Bench.playMoves(gameState, moves)
+
+        start = time.perf_counter()
+        if lazySmp:
+            (bestMove, bestScore) = gameState.iterativeDeepening(maxLevel=depth)
+        else:
+            (bestMove, bestScore) = gameState.alphaBeta(depth)
+        singleTime = time.perf_counter() - start
+
+        gameState = Engine.GameState()
+        Bench.playMoves(gameState, moves)
+
+        start = time.perf_counter()
+        if lazySmp:
+            parallelSearch.transpositionTable.clear()
+            (parallelMove, parallelScore) = parallelSearch.iterativeDeepening(gameState, maxLevel=depth)
+        else:
+            (parallelMove, parallelScore) = parallelSearch.alphaBeta(gameState, depth)
+        parallelTime = time.perf_counter() - start
+
+        totals[0] += singleTime
+        totals[1] += parallelTime
+
+        print("{:<26} single {:>7.2f}s  {} ({})  {} workers {:>7.2f}s  {} ({})  speedup {:.2f}".format(
+            name, singleTime, bestMove.getChessNotation(), bestScore, parallelSearch.workers, parallelTime,
+            parallelMove.getChessNotation(), parallelScore, singleTime / max(parallelTime, 1e-9)))
+
+    print("Total single {:.2f}s  parallel {:.2f}s  effective speedup {:.2f}".format(
+        totals[0], totals[1], totals[0] / max(totals[1], 1e-9)))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Compare the parallel searches with the single process alphaBeta")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="depth searched in every position")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per core)")
+    parser.add_argument("--lazy-smp", dest="lazySmp", action="store_true",
+                        help="lazy SMP (processes sharing a transposition table) instead of the root split")
+    arguments = parser.parse_args()
+
+    if arguments.lazySmp:
+        parallelSearch = LazySmpSearch(arguments.workers)
+    else:
+        parallelSearch = ParallelSearch(arguments.workers)
+
+    try:
+
+        compareSearches(parallelSearch, arguments.depth, arguments.lazySmp)
+
+    finally:
+
+        parallelSearch.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import sys
+import time
+
+from Chess import Engine
+
+# Standard perft positions and their known leaf node counts at every depth
+# (name, FEN, {depth: leaf nodes})
+PERFT_POSITIONS = [
+    ("Initial position", Engine.INITIAL_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609, 6: 119060324}),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603, 5: 193690690}),
+    ("Position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624, 6: 11030083}),
+    ("Position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333, 5: 15833292}),
+    ("Position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487, 5: 89941194}),
+    ("Position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594, 5: 164075551}),
+]
+
+DEFAULT_DEPTH = 4
+
+
+# Create the game state used by the perft runs, set to the position of the FEN
+def createGameState(arguments, fen):
+
+    return Engine.GameState.from_fen(fen, useBitboards=arguments.bitboards, moveGenerationMode=arguments.mode)
+
+
+# Run perft on every standard position up to the given depth, check the leaf node counts
+# and report the nodes per second. Returns True if every count matched
+def runSuite(arguments):
+
+    allPassed = True
+    totalNodes = 0
+    totalTime = 0
+
+    for (name, fen, expectedCounts) in PERFT_POSITIONS:
+
+        gameState = createGameState(arguments, fen)
+
+        for depth in sorted(expectedCounts):
+
+            if depth > arguments.depth:
+                break
+
+            start = time.perf_counter()
+            nodes = gameState.perft(depth)
+            elapsed = time.perf_counter() - start
+
+            totalNodes += nodes
+            totalTime += elapsed
+
+            passed = nodes == expectedCounts[depth]
+            allPassed = allPassed and passed
+
+            print("{:<20} depth {}  nodes {:>10}  expected {:>10}  {:>8.2f}s  {:>8.0f} nodes/s  {}".format(
+                name, depth, nodes, expectedCounts[depth], elapsed, nodes / max(elapsed, 1e-9),
+                "OK" if passed else "FAIL"))
+
+    print("Total nodes {}  time {:.2f}s  {:.0f} nodes/s".format(totalNodes, totalTime, totalNodes / max(totalTime, 1e-9)))
+
+    return allPassed
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Perft correctness and speed suite for the move generator")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="maximum depth searched in every position")
+    parser.add_argument("--divide", type=int, default=None,
+                        help="print the leaf node count under every move of the position at this depth")
+    parser.add_argument("--fen", default=Engine.INITIAL_FEN, help="position of --divide (default: the initial position)")
+    parser.add_argument("--bitboards", action="store_true", help="use the bitboard backend")
+    parser.add_argument("--filter", dest="mode", action="store_const", default=Engine.MOVE_GENERATION_LEGAL,
+                        const=Engine.MOVE_GENERATION_FILTER, help="filter the possible moves with make/undo")
+    arguments = parser.parse_args()
+
+    if arguments.divide is not None:
+
+        createGameState(arguments, arguments.fen).perftDivide(arguments.divide)
+        return
+
+    if not runSuite(arguments):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
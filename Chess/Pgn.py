@@ -0,0 +1,379 @@
+import argparse
+import io
+import re
+import sys
+import time
+
+from Chess import Engine
+
+# Results that end the movetext of a game
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+# The tags that every exported game has, in this order (the seven tag roster)
+SEVEN_TAG_ROSTER = [("Event", "?"), ("Site", "?"), ("Date", "????.??.??"), ("Round", "?"),
+                    ("White", "?"), ("Black", "?"), ("Result", "*")]
+
+# The movetext lines written by writeGame are at most this long
+LINE_LENGTH = 80
+
+# Games with a known movetext, checked by --check: (name, FEN, moves in chess notation, expected movetext)
+WRITER_CHECKS = [
+    ("Initial position", Engine.INITIAL_FEN, ["e2e4", "e7e5", "g1f3", "b8c6"], "1. e4 e5 2. Nf3 Nc6 *"),
+    ("Black to move", "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",
+     ["e7e5", "g1f3", "b8c6", "f1b5"], "1... e5 2. Nf3 Nc6 3. Bb5 *"),
+    ("Castling and promotion", "r3k3/6P1/8/8/8/8/8/4K2R w Kq - 0 30",
+     ["e1g1", "e8c8", "g7g8q"], "30. O-O O-O-O 31. g8=Q *"),
+]
+
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]$')
+
+# Comments, variations, move numbers and numeric annotation glyphs are skipped by the reader
+COMMENT_PATTERN = re.compile(r'\{[^}]*\}|;[^\n]*')
+VARIATION_PATTERN = re.compile(r'\([^()]*\)')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+')
+
+# piece letter, from file, from rank, capture, to square, promotion
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+# Castling in SAN => the castle value of the move
+CASTLING_SAN = {"O-O": 1, "O-O-O": 2, "0-0": 1, "0-0-0": 2}
+
+
+class PgnGame():
+
+    # headers => the tags of the game (name => value)
+    # gameState => the game state after replaying the moves of the game (the moves are in its move log)
+    # result => the result at the end of the movetext ("1-0", "0-1", "1/2-1/2", "*")
+    def __init__(self, headers, gameState, result):
+
+        self.headers = headers
+        self.gameState = gameState
+        self.result = result
+
+
+# Return the legal move of the current position written in Standard Algebraic Notation (e4, Nxf3+, exd8=Q, O-O).
+# Raises ValueError if no legal move or more than one legal move matches
+def parseSan(gameState, san):
+
+    # Check, checkmate and annotation suffixes don't change the move
+    san = san.rstrip("+#!?")
+
+    validMoves = gameState.calculateAllValidMoves()
+
+    if san in CASTLING_SAN:
+        matchingMoves = [move for move in validMoves if move.castle == CASTLING_SAN[san]]
+
+    else:
+
+        match = SAN_PATTERN.match(san)
+        if match is None:
+            raise ValueError("Invalid SAN move: " + san)
+
+        (pieceType, fromFile, fromRank, capture, toSquare, promotion) = match.groups()
+        pieceType = pieceType if pieceType is not None else Engine.PAWN
+
+        endRow = Engine.Move.rankToRow[toSquare[1]]
+        endCol = Engine.Move.fileToCol[toSquare[0]]
+
+        matchingMoves = [move for move in validMoves
+                         if move.endRow == endRow and move.endCol == endCol and move.castle == 0 and
+                         gameState.getTypeOfPiece(move.movedPiece) == pieceType and
+                         (fromFile is None or move.startCol == Engine.Move.fileToCol[fromFile]) and
+                         (fromRank is None or move.startRow == Engine.Move.rankToRow[fromRank]) and
+                         (move.pawnPromotion[1] if move.pawnPromotion is not None else None) == promotion]
+
+    if len(matchingMoves) != 1:
+        raise ValueError("{} SAN move: {} (in {})".format(
+            "Illegal" if len(matchingMoves) == 0 else "Ambiguous", san, gameState.to_fen()))
+
+    return matchingMoves[0]
+
+
+# Return the move (a legal move of the current position) written in Standard Algebraic Notation
+def getSan(gameState, move):
+
+    if move.castle != 0:
+
+        san = "O-O" if move.castle == 1 else "O-O-O"
+
+    else:
+
+        pieceType = gameState.getTypeOfPiece(move.movedPiece)
+        toSquare = move.getRankFile(move.endRow, move.endCol)
+        isCapture = move.capturedPiece != Engine.EMPTY_SQUARE
+
+        if pieceType == Engine.PAWN:
+
+            # A pawn capture names the file the pawn came from
+            san = move.colToFile[move.startCol] + "x" + toSquare if isCapture else toSquare
+
+            if move.pawnPromotion is not None:
+                san += "=" + move.pawnPromotion[1]
+
+        else:
+
+            # The other pieces of the same type that can move to the same square
+            rivals = [validMove for validMove in gameState.calculateAllValidMoves()
+                      if validMove.movedPiece == move.movedPiece and validMove.endRow == move.endRow and
+                      validMove.endCol == move.endCol and validMove != move]
+
+            disambiguation = ""
+            if len(rivals) != 0:
+
+                if all(rival.startCol != move.startCol for rival in rivals):
+                    disambiguation = move.colToFile[move.startCol]
+                elif all(rival.startRow != move.startRow for rival in rivals):
+                    disambiguation = move.rowToRank[move.startRow]
+                else:
+                    disambiguation = move.getRankFile(move.startRow, move.startCol)
+
+            san = pieceType + disambiguation + ("x" if isCapture else "") + toSquare
+
+    # Check or checkmate
+    gameState.makeMove(move)
+
+    if gameState.checkIfInCheck(Engine.WHITE if gameState.whiteToMove else Engine.BLACK):
+        san += "#" if len(gameState.calculateAllValidMoves()) == 0 else "+"
+
+    gameState.undoMove()
+
+    return san
+
+
+# Split the movetext of a game into SAN moves and the result
+def parseMovetext(movetext):
+
+    movetext = COMMENT_PATTERN.sub(" ", movetext)
+
+    # Remove the variations from the innermost out
+    previousMovetext = None
+    while previousMovetext != movetext:
+        previousMovetext = movetext
+        movetext = VARIATION_PATTERN.sub(" ", movetext)
+
+    sanMoves = []
+    result = "*"
+
+    for token in movetext.split():
+
+        token = MOVE_NUMBER_PATTERN.sub("", token)
+
+        if token == "" or token.startswith("$"):
+            continue
+
+        if token in RESULTS:
+            result = token
+            break
+
+        sanMoves.append(token)
+
+    return (sanMoves, result)
+
+
+# Create the game state of a game from its headers and replay the moves of its movetext.
+# maxPly => only the first plies of the game are replayed (None => every move)
+def replayGame(headers, movetext, maxPly = None):
+
+    (sanMoves, result) = parseMovetext(movetext)
+
+    if "FEN" in headers:
+        gameState = Engine.GameState.from_fen(headers["FEN"], transpositionTableSize=None)
+    else:
+        gameState = Engine.GameState(transpositionTableSize=None)
+
+    for san in sanMoves[:maxPly]:
+        gameState.makeMove(parseSan(gameState, san))
+
+    return PgnGame(headers, gameState, result)
+
+
+# Read the games of a PGN text stream (a file opened in text mode or any iterable of lines) one at a time.
+# Only the game being read is kept in memory, every game is replayed when it's reached.
+# skipInvalidGames => games with an invalid FEN or move are left out instead of raising ValueError
+# maxPly => only the first plies of every game are replayed (None => every move), a move past them isn't checked
+def readGames(stream, skipInvalidGames = False, maxPly = None):
+
+    headers = {}
+    movetextLines = []
+
+    for line in stream:
+
+        line = line.strip()
+
+        # Escaped line
+        if line.startswith("%"):
+            continue
+
+        match = TAG_PATTERN.match(line)
+
+        if match is not None:
+
+            # The tags of the next game start after the movetext of the previous one
+            if len(movetextLines) != 0:
+
+                game = replayGameOrSkip(headers, "\n".join(movetextLines), skipInvalidGames, maxPly)
+                if game is not None:
+                    yield game
+
+                headers = {}
+                movetextLines = []
+
+            headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+
+        elif line != "":
+
+            movetextLines.append(line)
+
+    if len(headers) != 0 or len(movetextLines) != 0:
+
+        game = replayGameOrSkip(headers, "\n".join(movetextLines), skipInvalidGames, maxPly)
+        if game is not None:
+            yield game
+
+
+# Return the replayed game, None if it's invalid and invalid games are skipped
+def replayGameOrSkip(headers, movetext, skipInvalidGames, maxPly):
+
+    try:
+
+        return replayGame(headers, movetext, maxPly)
+
+    except ValueError:
+
+        if not skipInvalidGames:
+            raise
+
+        return None
+
+
+# Return the result of the game in the current position of the game state ("*" if the game isn't over)
+def getResult(gameState):
+
+    if len(gameState.calculateAllValidMoves()) != 0:
+        return "*"
+
+    if gameState.checkIfInCheck(Engine.WHITE if gameState.whiteToMove else Engine.BLACK):
+        return "0-1" if gameState.whiteToMove else "1-0"
+
+    return "1/2-1/2"
+
+
+# Write the game of the game state (every move of its move log) as PGN. headers => extra or replacing tags
+def writeGame(stream, gameState, headers = None):
+
+    # Take back every move to find the position that the game started from, and to write the moves in SAN
+    moves = []
+    while len(gameState.moveLog) != 0:
+        moves.append(gameState.moveLog[-1])
+        gameState.undoMove()
+
+    moves.reverse()
+
+    startFen = gameState.to_fen()
+    moveNumber = gameState.initialPly // 2 + 1
+
+    tokens = []
+
+    for (moveIndex, move) in enumerate(moves):
+
+        if gameState.whiteToMove:
+            tokens.append(str(moveNumber) + ".")
+        elif moveIndex == 0:
+            tokens.append(str(moveNumber) + "...")
+
+        tokens.append(getSan(gameState, move))
+        gameState.makeMove(move)
+
+        # Black just moved
+        if gameState.whiteToMove:
+            moveNumber += 1
+
+    tags = dict(SEVEN_TAG_ROSTER)
+    tags["Result"] = getResult(gameState)
+
+    if startFen != Engine.INITIAL_FEN:
+        tags["SetUp"] = "1"
+        tags["FEN"] = startFen
+
+    if headers is not None:
+        tags.update(headers)
+
+    tokens.append(tags["Result"])
+
+    for (name, value) in tags.items():
+        stream.write('[{} "{}"]\n'.format(name, value.replace('\\', '\\\\').replace('"', '\\"')))
+
+    stream.write("\n")
+
+    # Wrap the movetext
+    line = ""
+    for token in tokens:
+
+        if line != "" and len(line) + 1 + len(token) > LINE_LENGTH:
+            stream.write(line + "\n")
+            line = ""
+
+        line = token if line == "" else line + " " + token
+
+    stream.write(line + "\n\n")
+
+
+# Write every game of WRITER_CHECKS and compare the movetext with the expected one. Returns True if they all match
+def checkWriter():
+
+    allMatch = True
+
+    for (name, fen, moves, expectedMovetext) in WRITER_CHECKS:
+
+        gameState = Engine.GameState.from_fen(fen, transpositionTableSize=None)
+        for notation in moves:
+            gameState.makeMove(gameState.findMoveByNotation(notation))
+
+        stream = io.StringIO()
+        writeGame(stream, gameState)
+
+        # The movetext follows the blank line after the tags
+        movetext = " ".join(stream.getvalue().split("\n\n")[1].split())
+        match = movetext == expectedMovetext
+        allMatch = allMatch and match
+
+        print("{:<24} {:<36} expected {:<36} {}".format(name, movetext, expectedMovetext, "OK" if match else "FAIL"))
+
+    return allMatch
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Replay every game of a PGN file")
+    parser.add_argument("path", nargs="?", help="PGN file")
+    parser.add_argument("--fen", action="store_true", help="print the final position of every game")
+    parser.add_argument("--check", action="store_true", help="check the movetext written for known games")
+    arguments = parser.parse_args()
+
+    if arguments.check:
+        sys.exit(0 if checkWriter() else 1)
+
+    if arguments.path is None:
+        parser.error("a PGN file is needed unless --check is given")
+
+    games = 0
+    plies = 0
+    start = time.perf_counter()
+
+    with open(arguments.path, encoding="utf-8", errors="replace") as stream:
+
+        for game in readGames(stream):
+
+            games += 1
+            plies += len(game.gameState.moveLog)
+
+            if arguments.fen:
+                print(game.gameState.to_fen())
+
+    elapsed = time.perf_counter() - start
+
+    print("Games {}  plies {}  {:.2f}s  {:.0f} plies/s".format(games, plies, elapsed, plies / max(elapsed, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import multiprocessing
+import queue
+import time
+
+from Chess import Book
+from Chess import Engine
+from Chess import TranspositionTable
+
+
+# Return the reply to the best move that the search expects (the best move stored in the transposition table
+# for the position after it), None if it isn't known
+def getExpectedReply(gameState, bestMove):
+
+    gameState.makeMove(bestMove)
+
+    expectedReply = None
+    hashMove = gameState.probeHashMove()
+
+    # The entry might belong to another position with the same index and key
+    if hashMove is not None and hashMove in gameState.calculateAllValidMoves():
+        expectedReply = hashMove.getChessNotation()
+
+    gameState.undoMove()
+
+    return expectedReply
+
+
+# Runs in the worker process: search the positions sent through the commands queue one at a time and put
+# (search id, best move in chess notation, score, expected reply in chess notation) on the results queue.
+# A None command stops the worker. The transposition table is kept between searches, so every search
+# starts from the work of the previous ones. Positions of the opening book are answered without a search
+def runSearchWorker(commands, results, stopEvent, transpositionTableSize, bookPath):
+
+    transpositionTable = TranspositionTable.TranspositionTable(transpositionTableSize)
+    book = Book.openBook(bookPath)
+
+    while True:
+
+        command = commands.get()
+
+        if command is None:
+            return
+
+        (searchId, fen, moves, maxLevel, moveTime) = command
+
+        gameState = Engine.GameState.from_fen(fen, transpositionTableSize=None)
+        gameState.transpositionTable = transpositionTable
+        gameState.stopEvent = stopEvent
+
+        # The moves played from the FEN position (the predicted move of a ponder search)
+        for notation in moves:
+            gameState.makeMove(gameState.findMoveByNotation(notation))
+
+        bookMove = book.selectMove(gameState) if book is not None else None
+        if bookMove is not None:
+            results.put((searchId, bookMove.getChessNotation(), 0, Book.getExpectedReply(book, gameState, bookMove)))
+            continue
+
+        (bestMove, bestScore) = gameState.iterativeDeepening(maxLevel=maxLevel, moveTime=moveTime)
+
+        if bestMove is None:
+            results.put((searchId, None, bestScore, None))
+        else:
+            results.put((searchId, bestMove.getChessNotation(), bestScore, getExpectedReply(gameState, bestMove)))
+
+
+class SearchWorker():
+
+    # Searches positions in a separate process, so that the caller (the pygame event loop) never waits for a search.
+    # The worker runs one search at a time, a search started while a cancelled one is still running waits for it.
+    # While the opponent thinks, the worker can ponder: search the position after the expected reply, which
+    # becomes the wanted search if the opponent plays that move
+    # bookPath => opening book of the worker, None or a missing file => no book
+    def __init__(self, transpositionTableSize = TranspositionTable.DEFAULT_SIZE_MB, bookPath = Book.DEFAULT_BOOK_PATH):
+
+        self.commands = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+
+        # Set to make the running search return the best move of its last completed iteration
+        self.stopEvent = multiprocessing.Event()
+
+        self.process = multiprocessing.Process(target=runSearchWorker, daemon=True,
+                                               args=(self.commands, self.results, self.stopEvent, transpositionTableSize,
+                                                     bookPath))
+        self.process.start()
+
+        # Id of the last search started
+        self.searchId = 0
+
+        # Id of the search running in the worker (None => the worker is idle)
+        self.runningSearch = None
+
+        # Id of the search whose result is wanted (None => no search or the search was cancelled)
+        self.wantedSearch = None
+
+        # The command of a search that waits for a cancelled search to finish
+        self.pendingCommand = None
+
+        # (search id, best move, score, expected reply) of the last search that finished
+        self.lastResult = None
+
+        # Id of the running ponder search (None => not pondering), the move it expects and when it started
+        self.ponderSearch = None
+        self.ponderMove = None
+        self.ponderStart = None
+
+        # Time (time.perf_counter()) at which poll stops the wanted search, None => the search stops by itself
+        self.searchDeadline = None
+
+    # Start searching the position of the game state (the previous search is cancelled).
+    # maxLevel, moveTime => the limits of GameState.iterativeDeepening (both None => search until stopped)
+    def startSearch(self, gameState, maxLevel = None, moveTime = None):
+
+        self.cancel()
+
+        self.searchId += 1
+        self.wantedSearch = self.searchId
+
+        self.queueCommand((self.searchId, gameState.to_fen(), [], maxLevel, moveTime))
+
+    # Search the position after the expected reply (in chess notation) of the opponent, who is to move in the
+    # game state, until ponderHit or cancel. The previous search is cancelled
+    def startPonder(self, gameState, expectedReply):
+
+        self.cancel()
+
+        self.searchId += 1
+        self.ponderSearch = self.searchId
+        self.ponderMove = expectedReply
+        self.ponderStart = time.perf_counter()
+
+        self.queueCommand((self.searchId, gameState.to_fen(), [expectedReply], None, None))
+
+    # The opponent played the move (in chess notation). If the ponder search expected it, it becomes the wanted
+    # search and gets moveTime seconds counted from the start of the pondering, so the answer comes at once if
+    # the opponent thought longer than that. Returns False (and cancels the pondering) otherwise
+    def ponderHit(self, move, moveTime):
+
+        if self.ponderSearch is None or move != self.ponderMove:
+            self.cancel()
+            return False
+
+        self.wantedSearch = self.ponderSearch
+        self.ponderSearch = None
+        self.searchDeadline = self.ponderStart + moveTime
+
+        return True
+
+    def queueCommand(self, command):
+
+        if self.runningSearch is None:
+            self.sendCommand(command)
+        else:
+            self.pendingCommand = command
+
+    def sendCommand(self, command):
+
+        self.stopEvent.clear()
+        self.runningSearch = command[0]
+        self.commands.put(command)
+
+    # Make the search answer now with the best move found so far (the result is still returned by poll)
+    def stop(self):
+
+        if self.runningSearch is not None and self.runningSearch == self.wantedSearch:
+            self.stopEvent.set()
+
+    # Drop the search (or the pondering), its result will never be returned by poll
+    def cancel(self):
+
+        self.wantedSearch = None
+        self.ponderSearch = None
+        self.pendingCommand = None
+        self.searchDeadline = None
+
+        if self.runningSearch is not None:
+            self.stopEvent.set()
+
+    # Indicates if a search whose result is wanted is running or waiting to run
+    def isThinking(self):
+
+        return self.wantedSearch is not None
+
+    # Return (best move, score, expected reply), moves in chess notation, once the wanted search is over,
+    # otherwise None. Never waits
+    def poll(self):
+
+        # The deadline applies once the search is running (it might still wait for a cancelled one)
+        if self.searchDeadline is not None and time.perf_counter() >= self.searchDeadline and\
+                self.runningSearch == self.wantedSearch:
+
+            self.searchDeadline = None
+            self.stop()
+
+        while self.runningSearch is not None:
+
+            try:
+                self.lastResult = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            self.runningSearch = None
+
+            # The cancelled search is over, the worker can take the next one
+            if self.pendingCommand is not None:
+                self.sendCommand(self.pendingCommand)
+                self.pendingCommand = None
+
+        # A ponder search can also finish on its own before the opponent moves
+        if self.lastResult is not None and self.lastResult[0] == self.wantedSearch:
+
+            self.wantedSearch = None
+            self.searchDeadline = None
+
+            return self.lastResult[1:]
+
+        return None
+
+    # Stop the worker process
+    def close(self):
+
+        self.cancel()
+        self.commands.put(None)
+        self.process.join()
@@ -0,0 +1,241 @@
+from multiprocessing import shared_memory
+
+# Bound types of a stored score
+EXACT = 0
+# The real score is at least the stored score (the search failed high)
+LOWER_BOUND = 1
+# The real score is at most the stored score (the search failed low)
+UPPER_BOUND = 2
+
+DEFAULT_SIZE_MB = 16
+
+# Approximate memory used by one entry: the references in the parallel lists plus the
+# 64 bit key and score objects (the moves are shared with the move generator)
+ENTRY_SIZE = 96
+
+
+class BaseTranspositionTable():
+
+    # Return the number of filled entries per thousand
+    def getUsage(self):
+
+        sample = min(self.size, 1000)
+
+        return sum(1 for index in range(sample) if self.isFilled(index)) * 1000 // sample
+
+    # Return the statistics of the table as a printable string
+    def getStats(self):
+
+        probes = self.hits + self.misses
+        hitRate = 100 * self.hits / probes if probes != 0 else 0
+
+        return "hits {} misses {} hit rate {:.1f}% stores {} overwrites {} usage {}/1000".format(
+            self.hits, self.misses, hitRate, self.stores, self.overwrites, self.getUsage())
+
+    # Reset the statistics
+    def resetStats(self):
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+
+class TranspositionTable(BaseTranspositionTable):
+
+    # sizeInMegabytes => memory budget of the table, rounded down to a power of two number of entries
+    def __init__(self, sizeInMegabytes = DEFAULT_SIZE_MB):
+
+        entries = max(1, int(sizeInMegabytes * 1024 * 1024) // ENTRY_SIZE)
+
+        # Number of entries (a power of two so that the index is just the low bits of the hash)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+
+        # The entries are stored in parallel lists to avoid one object per entry
+        self.keys = [None] * self.size
+        self.depths = [0] * self.size
+        self.scores = [0] * self.size
+        self.bounds = [EXACT] * self.size
+        self.moves = [None] * self.size
+        self.generations = [0] * self.size
+
+        # Incremented for every new search, so that entries left over from older searches get replaced first
+        self.generation = 0
+
+        self.resetStats()
+
+    # Start a new search (entries of older searches become the first ones to be replaced)
+    def newSearch(self):
+
+        self.generation += 1
+
+    # Return (depth, score, bound, move) stored for the position with the given hash, None if there is no entry
+    def probe(self, hash):
+
+        index = hash & self.mask
+
+        if self.keys[index] != hash:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        return (self.depths[index], self.scores[index], self.bounds[index], self.moves[index])
+
+    # Store the result of a search. An entry is replaced if it belongs to the same position, if it is
+    # left over from an older search or if it was searched to a smaller or equal depth
+    def store(self, hash, depth, score, bound, move):
+
+        index = hash & self.mask
+        storedKey = self.keys[index]
+
+        if storedKey is not None and storedKey != hash:
+
+            if self.generations[index] == self.generation and self.depths[index] > depth:
+                return
+
+            self.overwrites += 1
+
+        # Keep the best move of a previous search of the position if this search didn't find one
+        if move is None and storedKey == hash:
+            move = self.moves[index]
+
+        self.keys[index] = hash
+        self.depths[index] = depth
+        self.scores[index] = score
+        self.bounds[index] = bound
+        self.moves[index] = move
+        self.generations[index] = self.generation
+
+        self.stores += 1
+
+    # Remove every entry and reset the statistics
+    def clear(self):
+
+        self.__init__(self.size * ENTRY_SIZE / (1024 * 1024))
+
+    # Indicates if the entry at the index holds a position
+    def isFilled(self, index):
+
+        return self.keys[index] is not None
+
+
+# Shared table: every entry is two 64 bit words in a shared memory buffer, the key xored with the data
+# and the data, so that an entry torn by a concurrent write (or by a process stopped in the middle of
+# a write) doesn't validate and is treated as a miss. No locks are needed
+SHARED_ENTRY_SIZE = 16
+
+# Layout of the data word: move (18 bits, see Move.encode), depth (8 bits), bound (2 bits), generation (8 bits),
+# score (24 bits)
+MOVE_MASK = 0x3FFFF
+DEPTH_SHIFT = 18
+BOUND_SHIFT = 26
+GENERATION_SHIFT = 28
+SCORE_SHIFT = 36
+MAX_SHARED_DEPTH = 0xFF
+# Scores are stored with this offset so that they are never negative
+SCORE_OFFSET = 1 << 23
+
+
+class SharedTranspositionTable(BaseTranspositionTable):
+
+    # sizeInMegabytes => memory budget of the table, rounded down to a power of two number of entries
+    # name => name of the shared memory buffer of an existing table, None => create a new buffer
+    def __init__(self, sizeInMegabytes = DEFAULT_SIZE_MB, name = None):
+
+        entries = max(1, int(sizeInMegabytes * 1024 * 1024) // SHARED_ENTRY_SIZE)
+
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+
+        if name is None:
+            self.sharedMemory = shared_memory.SharedMemory(create=True, size=self.size * SHARED_ENTRY_SIZE)
+        else:
+            self.sharedMemory = shared_memory.SharedMemory(name=name)
+
+        self.name = self.sharedMemory.name
+        self.words = self.sharedMemory.buf.cast('Q')
+
+        # Only the processes that run the same search have to agree on the generation
+        self.generation = 0
+
+        # Statistics of this process
+        self.resetStats()
+
+    # Start a new search (entries of older searches become the first ones to be replaced)
+    def newSearch(self):
+
+        self.generation = (self.generation + 1) & 0xFF
+
+    # Return (depth, score, bound, move) stored for the position with the given hash, None if there is no entry.
+    # The move is packed (see Move.encode), GameState.decodeMove turns it back into a move of the position
+    def probe(self, hash):
+
+        index = (hash & self.mask) << 1
+
+        data = self.words[index + 1]
+
+        if self.words[index] ^ data != hash or data == 0:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        move = data & MOVE_MASK
+
+        return ((data >> DEPTH_SHIFT) & 0xFF, ((data >> SCORE_SHIFT) & 0xFFFFFF) - SCORE_OFFSET,
+                (data >> BOUND_SHIFT) & 0x3, move if move != 0 else None)
+
+    # Store the result of a search, with the same replacement rules as TranspositionTable.store
+    def store(self, hash, depth, score, bound, move):
+
+        index = (hash & self.mask) << 1
+
+        storedData = self.words[index + 1]
+        sameKey = storedData != 0 and self.words[index] ^ storedData == hash
+
+        if storedData != 0 and not sameKey:
+
+            if (storedData >> GENERATION_SHIFT) & 0xFF == self.generation and (storedData >> DEPTH_SHIFT) & 0xFF > depth:
+                return
+
+            self.overwrites += 1
+
+        encodedMove = move.encode() if move is not None else 0
+
+        # Keep the best move of a previous search of the position if this search didn't find one
+        if encodedMove == 0 and sameKey:
+            encodedMove = storedData & MOVE_MASK
+
+        data = encodedMove | min(depth, MAX_SHARED_DEPTH) << DEPTH_SHIFT | bound << BOUND_SHIFT | \
+            self.generation << GENERATION_SHIFT | (score + SCORE_OFFSET) << SCORE_SHIFT
+
+        self.words[index] = hash ^ data
+        self.words[index + 1] = data
+
+        self.stores += 1
+
+    # Remove every entry and reset the statistics of this process
+    def clear(self):
+
+        size = self.size * SHARED_ENTRY_SIZE
+        self.sharedMemory.buf[:size] = bytes(size)
+
+        self.resetStats()
+
+    # Indicates if the entry at the index holds a position
+    def isFilled(self, index):
+
+        return self.words[(index << 1) + 1] != 0
+
+    # Detach this process from the shared buffer
+    def close(self):
+
+        self.words.release()
+        self.sharedMemory.close()
+
+    # Free the shared buffer (by the process that created it, once every process closed the table)
+    def unlink(self):
+
+        self.sharedMemory.unlink()
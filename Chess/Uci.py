@@ -0,0 +1,322 @@
+import sys
+import threading
+import time
+
+# Only the engine is imported, the UCI front end never loads pygame
+from Chess import Book
+from Chess import Engine
+from Chess import TranspositionTable
+
+ENGINE_NAME = "Chess"
+ENGINE_AUTHOR = "Chess contributors"
+
+# Range of the Hash option (megabytes of the transposition table)
+MIN_HASH_MB = 1
+MAX_HASH_MB = 1024
+
+# Scores of the engine are in tenths of a pawn, UCI scores are in centipawns
+CENTIPAWNS_PER_UNIT = 10
+
+
+class UciEngine():
+
+    # output => stream that the responses are written to
+    def __init__(self, output = sys.stdout):
+
+        self.output = output
+
+        # The responses are written by the main thread and by the search thread
+        self.outputLock = threading.Lock()
+
+        self.hashSize = TranspositionTable.DEFAULT_SIZE_MB
+
+        # Kept across positions and games (until ucinewgame), so that the next search starts warm
+        self.transpositionTable = TranspositionTable.TranspositionTable(self.hashSize)
+
+        # The running search (a thread) and the event that stops it
+        self.searchThread = None
+        self.stopEvent = threading.Event()
+
+        # Indicates if the running search has no limit and only ends when stopped
+        self.searchInfinite = False
+
+        # The opening book, its moves are played without a search (None => no book)
+        self.bookPath = Book.DEFAULT_BOOK_PATH
+        self.book = Book.openBook(self.bookPath)
+
+        # The position to search, None after an invalid position command (the engine refuses to search until
+        # the next valid one)
+        self.gameState = self.createGameState(Engine.INITIAL_FEN)
+
+    # Write one response line
+    def send(self, line):
+
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    # Return a game state set to the FEN that uses the shared transposition table
+    def createGameState(self, fen):
+
+        gameState = Engine.GameState.from_fen(fen, transpositionTableSize=None)
+        gameState.transpositionTable = self.transpositionTable
+        gameState.stopEvent = self.stopEvent
+
+        return gameState
+
+    # Handle one command line. Returns False once the engine has to quit
+    def handleCommand(self, line):
+
+        tokens = line.split()
+
+        if len(tokens) == 0:
+            return True
+
+        command = tokens[0]
+
+        if command == "uci":
+
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default {} min {} max {}".format(
+                TranspositionTable.DEFAULT_SIZE_MB, MIN_HASH_MB, MAX_HASH_MB))
+            self.send("option name BookFile type string default " + Book.DEFAULT_BOOK_PATH)
+            self.send("uciok")
+
+        elif command == "isready":
+
+            self.send("readyok")
+
+        elif command == "setoption":
+
+            self.setOption(tokens[1:])
+
+        elif command == "ucinewgame":
+
+            self.finishSearch()
+            self.transpositionTable.clear()
+            self.gameState = self.createGameState(Engine.INITIAL_FEN)
+
+        elif command == "position":
+
+            self.finishSearch()
+            self.setPosition(tokens[1:])
+
+        elif command == "go":
+
+            self.finishSearch()
+            self.startSearch(tokens[1:])
+
+        elif command == "stop":
+
+            self.stopSearch()
+
+        elif command == "quit":
+
+            self.stopSearch()
+            return False
+
+        # Unknown commands are ignored, as the protocol asks
+        return True
+
+    # setoption name <name> value <value>
+    def setOption(self, tokens):
+
+        if "name" not in tokens or "value" not in tokens:
+            return
+
+        nameIndex = tokens.index("name")
+        valueIndex = tokens.index("value")
+        name = " ".join(tokens[nameIndex + 1:valueIndex]).lower()
+        value = " ".join(tokens[valueIndex + 1:])
+
+        if name == "hash":
+
+            self.finishSearch()
+
+            try:
+                self.hashSize = min(max(int(value), MIN_HASH_MB), MAX_HASH_MB)
+            except ValueError:
+                return
+
+            self.transpositionTable = TranspositionTable.TranspositionTable(self.hashSize)
+
+            if self.gameState is not None:
+                self.gameState.transpositionTable = self.transpositionTable
+
+        # An empty or missing file turns the book off
+        elif name == "bookfile":
+
+            self.finishSearch()
+
+            if self.book is not None:
+                self.book.close()
+
+            self.bookPath = value
+            self.book = Book.openBook(value if value not in ("", "<empty>") else None)
+
+    # position [startpos | fen <fen>] [moves <move> ...]
+    # An invalid FEN or move clears the position, the previous one is never searched in its place
+    def setPosition(self, tokens):
+
+        if "moves" in tokens:
+            movesIndex = tokens.index("moves")
+            (positionTokens, moves) = (tokens[:movesIndex], tokens[movesIndex + 1:])
+        else:
+            (positionTokens, moves) = (tokens, [])
+
+        if len(positionTokens) != 0 and positionTokens[0] == "fen":
+            fen = " ".join(positionTokens[1:])
+        else:
+            fen = Engine.INITIAL_FEN
+
+        try:
+
+            gameState = self.createGameState(fen)
+
+            for notation in moves:
+
+                move = gameState.findMoveByNotation(notation)
+                if move is None:
+                    raise ValueError("Illegal move: " + notation)
+
+                gameState.makeMove(move)
+
+        except ValueError as error:
+
+            self.send("info string " + str(error))
+            self.gameState = None
+            return
+
+        self.gameState = gameState
+
+    # go [depth <plies>] [movetime <ms>] [wtime <ms>] [btime <ms>] [winc <ms>] [binc <ms>] [infinite]
+    # Starts the search on its own thread, so that stop and isready are still answered while it runs
+    def startSearch(self, tokens):
+
+        if self.gameState is None:
+            self.send("info string No valid position to search")
+            self.send("bestmove 0000")
+            return
+
+        limits = {}
+        for (index, token) in enumerate(tokens[:-1]):
+
+            if token in ("depth", "movetime", "wtime", "btime", "winc", "binc"):
+                try:
+                    limits[token] = int(tokens[index + 1])
+                except ValueError:
+                    pass
+
+        maxLevel = limits.get("depth")
+        moveTime = limits["movetime"] / 1000 if "movetime" in limits else None
+
+        (clock, clockIncrement) = ("wtime", "winc") if self.gameState.whiteToMove else ("btime", "binc")
+        remainingTime = limits[clock] / 1000 if clock in limits else None
+        increment = limits.get(clockIncrement, 0) / 1000
+
+        # No limit at all (go infinite or a bare go) => search until stopped
+        self.searchInfinite = maxLevel is None and moveTime is None and remainingTime is None
+
+        self.stopEvent.clear()
+
+        self.searchThread = threading.Thread(target=self.search, args=(maxLevel, moveTime, remainingTime, increment),
+                                             daemon=True)
+        self.searchThread.start()
+
+    # Runs on the search thread: search the current position and report the best move
+    def search(self, maxLevel, moveTime, remainingTime, increment):
+
+        gameState = self.gameState
+
+        # A book move is played at once, except in an infinite search (the best move has to wait for stop)
+        if self.book is not None and not self.searchInfinite:
+
+            bookMove = self.book.selectMove(gameState)
+
+            if bookMove is not None:
+                self.send("info string book move")
+                self.send("bestmove " + bookMove.getChessNotation())
+                return
+
+        start = time.perf_counter()
+        nodesBefore = gameState.nodes
+
+        (bestMove, bestScore) = gameState.iterativeDeepening(maxLevel=maxLevel, moveTime=moveTime,
+                                                             remainingTime=remainingTime, increment=increment)
+
+        elapsed = time.perf_counter() - start
+        nodes = gameState.nodes - nodesBefore
+
+        # The search can end by itself (a mate found or no legal move), the best move of an infinite search
+        # still has to wait for stop
+        if self.searchInfinite:
+            self.stopEvent.wait()
+
+        if bestMove is None:
+            self.send("bestmove 0000")
+            return
+
+        self.send("info depth {} score {} nodes {} time {} nps {}".format(
+            gameState.completedLevel, self.formatScore(bestScore, gameState.whiteToMove), nodes,
+            int(elapsed * 1000), int(nodes / max(elapsed, 1e-9))))
+        self.send("bestmove " + bestMove.getChessNotation())
+
+    # Return the score (positive in favor of white) as a UCI score from the point of view of the player to move
+    def formatScore(self, score, whiteToMove):
+
+        if not whiteToMove:
+            score = -score
+
+        if abs(score) > Engine.MATE_THRESHOLD:
+
+            # Mate in moves, the score is MATE_SCORE minus the plies to the checkmate
+            plies = Engine.MATE_SCORE - abs(score)
+            moves = (plies + 1) // 2
+
+            return "mate {}".format(moves if score > 0 else -moves)
+
+        return "cp {}".format(score * CENTIPAWNS_PER_UNIT)
+
+    # Stop the running search (its best move gets reported) and wait for it to finish
+    def stopSearch(self):
+
+        if self.searchThread is None:
+            return
+
+        self.stopEvent.set()
+        self.searchThread.join()
+        self.searchThread = None
+
+    # Wait for the running search to report its best move before the next command. A search with limits is
+    # left to reach them, only a search without limits (go infinite) is stopped
+    def finishSearch(self):
+
+        if self.searchThread is None:
+            return
+
+        if self.searchInfinite:
+            self.stopSearch()
+            return
+
+        self.searchThread.join()
+        self.searchThread = None
+
+    # Read commands until quit or the end of the input. At the end of the input a search with limits
+    # is left to finish, so that piped commands get their best move
+    def run(self, input = sys.stdin):
+
+        for line in input:
+            if not self.handleCommand(line):
+                return
+
+        self.finishSearch()
+
+
+def main():
+
+    UciEngine().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import random
+
+from Chess import Bitboard
+
+# The keys come from a fixed seed so that every process computes the same hash for the same position
+ZOBRIST_SEED = 20200517
+
+_generator = random.Random(ZOBRIST_SEED)
+
+# One key for every piece on every square (piece => list of 64 keys, indexed by row * 8 + col)
+PIECE_KEYS = {piece: [_generator.getrandbits(64) for square in range(64)] for piece in Bitboard.PIECES}
+
+# Xored in when it's black's turn to move
+BLACK_TO_MOVE_KEY = _generator.getrandbits(64)
+
+# One key for every castling right (white short, white long, black short, black long)
+CASTLING_RIGHT_KEYS = [_generator.getrandbits(64) for right in range(4)]
+
+# Key of every combination of castling rights (a 4 bit mask, see GameState.getCastlingRights)
+CASTLING_KEYS = [0] * 16
+for rights in range(16):
+    for right in range(4):
+        if rights & (1 << right):
+            CASTLING_KEYS[rights] ^= CASTLING_RIGHT_KEYS[right]
+
+# One key for the file of the pawn that can be captured en passant
+EN_PASSANT_KEYS = [_generator.getrandbits(64) for file in range(8)]
+
+
+# Return the key of the en passant file (None => no en passant)
+def getEnPassantKey(enPassantFile):
+
+    if enPassantFile is None:
+        return 0
+
+    return EN_PASSANT_KEYS[enPassantFile]
+
+
+# Compute the hash of a position from scratch
+def computeHash(board, whiteToMove, castlingRights, enPassantFile):
+
+    hash = 0
+
+    for row in range(8):
+        for col in range(8):
+
+            piece = board[row][col]
+            if piece in PIECE_KEYS:
+                hash ^= PIECE_KEYS[piece][row * 8 + col]
+
+    if not whiteToMove:
+        hash ^= BLACK_TO_MOVE_KEY
+
+    return hash ^ CASTLING_KEYS[castlingRights] ^ getEnPassantKey(enPassantFile)